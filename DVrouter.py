@@ -4,68 +4,192 @@
 # HUID:
 #####################################################
 
+import struct
+from array import array
+from typing import Dict, List
 from router import Router
+from packet import Packet
+from lsdb import AddressTable
+from lsp_codec import decode, encode
+
+INF = float("inf")
+
+# Kinds of distance vector packets, in the sequence number field of the header: a full
+# vector replaces the neighbor's vector (missing destinations are unreachable), a diff
+# only updates the destinations it lists.
+DIFF = 0
+FULL = 1
 
 
 class DVrouter(Router):
     """Distance vector routing protocol implementation.
 
-    Add your own class fields and initialization code (e.g. to create forwarding table
-    data structures). See the `Router` base class for docstrings of the methods to
-    override.
+    Distances are stored in arrays indexed by address id: one for this router and one
+    per neighbor, with the distances last advertised by that neighbor. When a neighbor
+    vector or a link changes, only the destinations it affects are recomputed, and only
+    the destinations whose distance or next hop changed are sent to the neighbors (a
+    triggered diff, sent once per iteration of the main loop). The full vector is sent
+    every `heartbeat_time`, and to a new neighbor.
+
+    Routes are advertised with split horizon and poisoned reverse: a neighbor that is
+    the next hop to a destination is told that the destination is unreachable. Costs of
+    at least `infinity` mean unreachable, which bounds counting to infinity in larger
+    loops. `infinity` must be larger than the cost of any shortest route: `Network`
+    derives it from the number of routers and the largest link cost.
+
+    Routers store their state by address id. Routers of the same network must share
+    the `addresses` table; a router created without one gets its own.
     """
 
-    def __init__(self, addr, heartbeat_time):
+    network_args = ("addresses", "infinity")
+
+    __slots__ = ("heartbeat_time", "last_time", "infinity", "addresses", "self_id",
+                 "neighbors", "link_costs", "vectors", "distances", "next_ports",
+                 "changed")
+
+    def __init__(self, addr, heartbeat_time, addresses=None, infinity=1024):
         Router.__init__(self, addr)  # Initialize base class - DO NOT REMOVE
         self.heartbeat_time = heartbeat_time
         self.last_time = 0
-        # TODO
-        #   add your own class fields and initialization code here
-        pass
+        self.infinity = infinity
+        if addresses is None:
+            addresses = AddressTable()
+        self.addresses: AddressTable = addresses  # Shared by all routers of the network
+        self.self_id: int = self.addresses.intern(addr)
+        self.neighbors: Dict[int, str] = {}  # port: endpoint address
+        self.link_costs: Dict[int, float] = {}  # port: cost
+        self.vectors: Dict[int, array] = {}  # port: distances advertised, by dst id
+        self.distances = array("d")  # dst id: distance, inf if unreachable
+        self.next_ports = array("i")  # dst id: port, -1 if unreachable
+        self.changed: Dict[int, None] = {}  # dst ids to send in the next diff
+        self.grow()
+
+    def grow(self):
+        """Extend the arrays when new addresses were added to the address table."""
+        missing = len(self.addresses) - len(self.distances)
+        if missing > 0:
+            self.distances.extend([INF] * missing)
+            self.next_ports.extend([-1] * missing)
+            for vector in self.vectors.values():
+                vector.extend([INF] * missing)
+            self.distances[self.self_id] = 0
+
+    def update_routes(self, dst_ids):
+        """Recompute the distance and next hop of the destinations `dst_ids`."""
+        self.route_computations += 1
+        distances, next_ports = self.distances, self.next_ports
+        candidates = [(self.link_costs[port], port, vector)
+                      for port, vector in self.vectors.items()]
+        for dst_id in dst_ids:
+            if dst_id == self.self_id:
+                continue
+            best, best_port = INF, -1
+            for cost, port, vector in candidates:
+                distance = cost + vector[dst_id]
+                if distance < best:
+                    best, best_port = distance, port
+            if best >= self.infinity:
+                best, best_port = INF, -1
+            if distances[dst_id] != best or next_ports[dst_id] != best_port:
+                distances[dst_id] = best
+                next_ports[dst_id] = best_port
+                self.changed[dst_id] = None
+
+    def advertised(self, port, dst_id):
+        """Return the distance to `dst_id` advertised on `port` (poisoned reverse)."""
+        if self.next_ports[dst_id] == port or self.distances[dst_id] == INF:
+            return self.infinity
+        return self.distances[dst_id]
+
+    def send_full(self, port):
+        """Send the full distance vector to the neighbor on `port`."""
+        entries = {dst_id: distance for dst_id, distance in enumerate(self.distances)
+                   if distance < INF and self.next_ports[dst_id] != port}
+        content = encode(self.self_id, FULL, entries)
+        self.send(port, Packet(Packet.ROUTING, self.addr, None, content))
+
+    def send_diffs(self):
+        """Send the destinations that changed since the last update to all neighbors."""
+        changed = list(self.changed)
+        self.changed = {}
+        for port in list(self.neighbors):
+            entries = {dst_id: self.advertised(port, dst_id) for dst_id in changed}
+            content = encode(self.self_id, DIFF, entries)
+            self.send(port, Packet(Packet.ROUTING, self.addr, None, content))
 
     def handle_packet(self, port, packet):
         """Process incoming packet."""
-        # TODO
         if packet.is_traceroute:
-            # Hint: this is a normal data packet
-            # If the forwarding table contains packet.dst_addr
-            #   send packet based on forwarding table, e.g., self.send(port, packet)
-            pass
+            dst_id = self.addresses.ids.get(packet.dst_addr)
+            if dst_id is not None and dst_id < len(self.next_ports):
+                next_port = self.next_ports[dst_id]
+                if next_port >= 0:
+                    self.send(next_port, packet)
+            return
+
+        vector = self.vectors.get(port)
+        if vector is None:
+            return
+        try:
+            _, kind, entries = decode(packet.content)
+        except (struct.error, TypeError, UnicodeEncodeError):
+            return
+        if entries and max(entries) >= len(vector):
+            self.grow()
+        infinity = self.infinity
+        affected: List[int] = []
+        if kind == FULL:
+            updates = ((dst_id, entries.get(dst_id, INF))
+                       for dst_id in range(len(vector)))
         else:
-            # Hint: this is a routing packet generated by your routing protocol
-            # If the received distance vector is different
-            #   update the local copy of the distance vector
-            #   update the distance vector of this router
-            #   update the forwarding table
-            #   broadcast the distance vector of this router to neighbors
-            pass
+            updates = entries.items()
+        for dst_id, distance in updates:
+            if distance >= infinity:
+                distance = INF
+            if vector[dst_id] != distance:
+                vector[dst_id] = distance
+                affected.append(dst_id)
+        if affected:
+            self.update_routes(affected)
 
     def handle_new_link(self, port, endpoint, cost):
         """Handle new link."""
-        # TODO
-        #   update the distance vector of this router
-        #   update the forwarding table
-        #   broadcast the distance vector of this router to neighbors
-        pass
+        endpoint_id = self.addresses.intern(endpoint)
+        self.grow()
+        self.neighbors[port] = endpoint
+        self.link_costs[port] = cost
+        # Until the neighbor sends its vector, only the neighbor itself is known
+        vector = array("d", [INF]) * len(self.distances)
+        vector[endpoint_id] = 0
+        self.vectors[port] = vector
+        self.update_routes([endpoint_id])
+        self.send_full(port)
 
     def handle_remove_link(self, port):
         """Handle removed link."""
-        # TODO
-        #   update the distance vector of this router
-        #   update the forwarding table
-        #   broadcast the distance vector of this router to neighbors
-        pass
+        if port not in self.vectors:
+            return
+        del self.vectors[port]
+        del self.link_costs[port]
+        del self.neighbors[port]
+        self.update_routes(
+            [dst_id for dst_id, next_port in enumerate(self.next_ports)
+             if next_port == port]
+        )
 
     def handle_time(self, time_ms):
         """Handle current time."""
         if time_ms - self.last_time >= self.heartbeat_time:
             self.last_time = time_ms
-            # TODO
-            #   broadcast the distance vector of this router to neighbors
-            pass
+            self.changed = {}
+            for port in list(self.neighbors):
+                self.send_full(port)
+        elif self.changed:
+            self.send_diffs()
 
     def __repr__(self):
         """Representation for debugging in the network visualizer."""
-        # TODO
-        #   NOTE This method is for your own convenience and will not be graded
-        return f"DVrouter(addr={self.addr})"
+        names = self.addresses.names
+        routes = {names[dst_id]: (self.distances[dst_id], port)
+                  for dst_id, port in enumerate(self.next_ports) if port >= 0}
+        return f"DVrouter(addr={self.addr}, routes={routes})"
@@ -7,106 +7,329 @@
 
 from router import Router
 from packet import Packet
+from lsdb import EMPTY_ROW, ROWS, AddressTable, LinkStateDB
+from lsp_codec import DECODE_CACHE, decode, encode, peek
 from collections import defaultdict
+from array import array
+from bisect import insort
 import heapq
-import json
+import struct
 from typing import Dict, Tuple, List
 
+INF = float('inf')
+EMPTY_IDS = array('i')
+# Các số thứ tự đặc biệt đánh dấu gói điều khiển (seq của LSP bắt đầu từ 1), nội
+# dung là {origin_id: seq}:
+# - ACK: các LSP đã nhận,
+# - SUMMARY: tóm tắt LSDB, gửi cho neighbor mới khi liên kết được thiết lập; nó
+#   cũng là yêu cầu các LSP mà neighbor có bản mới hơn.
+ACK = 0
+SUMMARY = 0xFFFFFFFF
+MASK64 = (1 << 64) - 1
+
+
+def flow_hash(src_id, dst_id, seed):
+    # Băm (src, dst) để chọn một trong các next hop cùng chi phí (ECMP): cùng một
+    # luồng luôn đi cùng một đường, và seed khác nhau ở mỗi router để các router
+    # không cùng chọn một nhánh. Không dùng hash() vì hash của str thay đổi giữa các
+    # lần chạy.
+    h = ((src_id << 32 | dst_id) + seed * 0x9E3779B97F4A7C15) & MASK64
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & MASK64
+    return h ^ (h >> 31)
+
 
 class LSrouter(Router):
-    def __init__(self, addr, heartbeat_time):
+    __slots__ = ("heartbeat_time", "last_time", "addresses", "self_id", "link_costs",
+                 "link_state_db", "sequence_numbers", "forwarding_table", "neighbors",
+                 "seq_num", "spf_links", "in_edges", "distances", "previous",
+                 "dirty_origins", "spf_hold_time", "spf_pending_since", "refresh_time",
+                 "lsp_min_interval", "lsp_max_interval", "lsp_hold", "next_lsp_time",
+                 "lsp_pending", "retransmit_time", "router_ports", "flood_queue",
+                 "pending_acks", "retransmit", "now", "ecmp", "next_hops")
+
+    network_args = ("addresses",)
+
+    def __init__(self, addr, heartbeat_time, addresses=None, spf_hold_time=0,
+                 refresh_time=None, lsp_min_interval=None, lsp_max_interval=None,
+                 retransmit_time=None, ecmp=False):
         Router.__init__(self, addr)
-        self.heartbeat_time = heartbeat_time # thời gian giữa các lần gửi LSP định kỳ.
+        self.heartbeat_time = heartbeat_time
         self.last_time = 0 # thời điểm cuối cùng gửi LSP.
 
+        # Điều khiển flooding:
+        # - LSP định kỳ chỉ gửi lại sau refresh_time (mặc định 10 heartbeat),
+        # - thay đổi liên kết được gửi ngay, nhưng hai LSP liên tiếp cách nhau ít nhất
+        #   lsp_hold; lsp_hold tăng gấp đôi mỗi lần (tối đa lsp_max_interval) và trở
+        #   về lsp_min_interval khi không có thay đổi trong lsp_max_interval,
+        # - LSP gửi cho router hàng xóm được gửi lại sau retransmit_time đến khi có ACK.
+        self.refresh_time = refresh_time or 10 * heartbeat_time
+        self.lsp_min_interval = lsp_min_interval or heartbeat_time / 10
+        self.lsp_max_interval = lsp_max_interval or heartbeat_time
+        self.lsp_hold = self.lsp_min_interval
+        self.next_lsp_time = 0  # thời điểm sớm nhất của LSP tiếp theo
+        self.lsp_pending = False  # liên kết của mình đã thay đổi từ LSP trước
+        self.retransmit_time = retransmit_time or 5 * heartbeat_time
+        self.router_ports = set()  # các port đã nhận routing packet (không phải client)
+        # origin_id: (packet, các port đã có LSP này), flood ở cuối vòng lặp
+        self.flood_queue: Dict[int, Tuple[Packet, set]] = {}
+        self.pending_acks: Dict[int, Dict[int, int]] = {}  # port: {origin_id: seq}
+        # port: {origin_id: (seq, packet, thời điểm gửi)} các LSP chưa được ACK
+        self.retransmit: Dict[int, Dict[int, Tuple[int, Packet, float]]] = {}
+        self.now = 0  # thời điểm của lần gọi handle_time gần nhất
+
+        # Địa chỉ được đánh số nguyên (dùng chung cho cả network) để lưu trạng thái
+        # định tuyến trong các mảng; router tạo riêng lẻ có bảng địa chỉ của riêng nó
+        if addresses is None:
+            addresses = AddressTable()
+        self.addresses: AddressTable = addresses
+        self.self_id: int = self.addresses.intern(addr)
+
         self.link_costs: Dict[Tuple[int, str], float] = {}  # (port, endpoint_addr): cost; vd: {(1, 'B'): 2.0}
-        self.link_state_db: Dict[str, Dict[str, float]] = defaultdict(dict)  # router_addr: {neighbor_addr: cost}; vd 'A': {'B': 1.0, 'C': 3.0},
-        self.sequence_numbers: Dict[str, int] = {}  # router_addr: seq_num
-        self.forwarding_table: Dict[str, int] = {}  # dst_addr: port; vd {'C': 2}
+        self.link_state_db = LinkStateDB()  # router_id: (neighbor_ids, costs)
+        self.sequence_numbers: Dict[int, int] = {}  # router_id: seq_num
+        self.forwarding_table = array('i')  # dst_id: port, -1 nếu không có đường đi
+        # ECMP: giữ tất cả các next hop cùng chi phí, chọn theo luồng (src, dst)
+        self.ecmp = ecmp
+        self.next_hops: List[Tuple[int, ...]] = []  # dst_id: các port (chỉ khi ecmp)
         self.neighbors: Dict[int, str] = {}  # port: endpoint_addr; vd {1: 'B', 2: 'C'}
         self.seq_num: int = 0
 
         # Đảm bảo self.addr có entry trong link_state_db ngay từ đầu
-        self.link_state_db[self.addr] = {}
+        self.link_state_db.set(self.self_id, EMPTY_ROW)
+
+        # Trạng thái của SPF gia tăng
+        self.spf_links = LinkStateDB()  # LSDB tại lần tính SPF gần nhất
+        self.in_edges: List[array] = []  # neighbor_id: các router_id có cạnh tới neighbor_id
+        self.distances = array('d')  # node_id: khoảng cách, inf nếu không tới được
+        self.previous = array('i')  # node_id: nút trước trên SPT, -1 nếu không có
+        self.dirty_origins: Dict[int, None] = {}  # router có liên kết thay đổi từ lần SPF trước
+        self.spf_hold_time = spf_hold_time  # thời gian chờ gom các thay đổi trước khi tính SPF
+        self.spf_pending_since = None
+        self.grow()
+
+    def grow(self):
+        # Mở rộng các mảng khi có địa chỉ mới trong bảng địa chỉ
+        missing = len(self.addresses) - len(self.distances)
+        if missing > 0:
+            self.distances.extend([INF] * missing)
+            self.previous.extend([-1] * missing)
+            self.in_edges.extend([EMPTY_IDS] * missing)
+            self.distances[self.self_id] = 0
 
     def dijkstra(self):
-        distances: Dict[str, float] = {self.addr: 0}
-        previous: Dict[str, str] = {}
-        pq: List[Tuple[float, str]] = [(0, self.addr)]
-
-        # Tạo một bản sao của LSDB để tránh thay đổi trong quá trình chạy Dijkstra
-        lsdb_copy = {router: dict(links)
-            for router, links in self.link_state_db.items()}
+        # Tính lại toàn bộ cây đường đi ngắn nhất (SPT) từ LSDB hiện tại
+        self.grow()
+        self.spf_links = self.link_state_db.copy()
+        in_edges = [[] for _ in range(len(self.distances))]
+        for router in self.spf_links.origins():
+            for neighbor in self.spf_links.get(router)[0]:
+                in_edges[neighbor].append(router)
+        self.in_edges = [ROWS.get_ids(tuple(routers)) for routers in in_edges]
+        self.dirty_origins = {}
+
+        size = len(self.distances)
+        distances = array('d', [INF]) * size
+        distances[self.self_id] = 0
+        pq: List[Tuple[float, int]] = [(0, self.self_id)]
 
         while pq:
             current_dist, current_node = heapq.heappop(pq)
 
             # Tối ưu: bỏ qua nếu đã tính toán đường đi tốt hơn
-            if current_dist > distances.get(current_node, float('inf')):
+            if current_dist > distances[current_node]:
                 continue
 
-            # Kiểm tra xem nút hiện tại có trong LSDB không
-            if current_node not in lsdb_copy:
-                continue
-
-            # Xử lý các nút lân cận, sắp xếp theo tên để đảm bảo tie-breaking nhất quán
-            sorted_neighbors = sorted(lsdb_copy[current_node].items(), key=lambda x: x[0])
-
-            for neighbor_node, cost in sorted_neighbors:
+            for neighbor_node, cost in self.spf_links.neighbors(current_node):
                 new_dist = current_dist + cost
-
-                # Cập nhật nếu tìm thấy đường đi ngắn hơn
-                if new_dist < distances.get(neighbor_node, float('inf')):
+                if new_dist < distances[neighbor_node]:
                     distances[neighbor_node] = new_dist
-                    previous[neighbor_node] = current_node
                     heapq.heappush(pq, (new_dist, neighbor_node))
 
-                # Xử lý tie-breaking: nếu cùng độ dài, ưu tiên đường đi có thứ tự từ điển nhỏ hơn
-                elif new_dist == distances.get(neighbor_node, float('inf')):
-                    if current_node < previous.get(neighbor_node, current_node):
-                        previous[neighbor_node] = current_node
-
-        # Xây dựng bảng chuyển tiếp
-        new_forwarding_table: Dict[str, int] = {}
+        self.distances = distances
+        self.previous = array('i', [-1]) * size
+        for node in range(size):
+            if node != self.self_id and distances[node] < INF:
+                self.previous[node] = self.best_previous(node)
+        self.route_computations += 1
+        self.update_forwarding_table()
+
+    def best_previous(self, node):
+        # Tie-breaking: trong các nút trước có cùng độ dài đường đi, chọn nút có địa chỉ
+        # nhỏ nhất theo thứ tự từ điển
+        return min(self.equal_cost_previous(node), key=self.addresses.names.__getitem__)
+
+    def equal_cost_previous(self, node):
+        # Tất cả các nút trước của node trên các đường đi ngắn nhất
+        distances = self.distances
+        target = distances[node]
+        for prev, cost in self.in_links(node):
+            if distances[prev] + cost == target:
+                yield prev
+
+    def in_links(self, node):
+        # Các cạnh vào node: (router_id, cost)
+        for prev in self.in_edges[node]:
+            yield prev, self.spf_links.cost(prev, node)
+
+    def incremental_spf(self, origin):
+        # Cập nhật SPT khi chỉ có các liên kết của `origin` thay đổi: chỉ tính lại
+        # cây con bị ảnh hưởng thay vì chạy lại Dijkstra trên toàn bộ đồ thị
+        old_links = dict(self.spf_links.neighbors(origin))
+        self.spf_links.set(origin, self.link_state_db.get(origin, EMPTY_ROW))
+        new_links = dict(self.spf_links.neighbors(origin))
+        for neighbor in old_links.keys() ^ new_links.keys():
+            routers = list(self.in_edges[neighbor])
+            if neighbor in new_links:
+                insort(routers, origin)
+            else:
+                routers.remove(origin)
+            self.in_edges[neighbor] = ROWS.get_ids(tuple(routers))
+
+        distances, previous = self.distances, self.previous
+        if distances[origin] == INF:
+            # origin không tới được nên các liên kết của nó không nằm trên SPT
+            return
+
+        old_distances: Dict[int, float] = {}  # node_id: khoảng cách trước khi cập nhật
+        pq: List[Tuple[float, int]] = []
+
+        # Cạnh trên SPT bị xóa hoặc tăng chi phí: tính lại cây con bên dưới nó từ các
+        # nút không bị ảnh hưởng
+        roots = [neighbor for neighbor, cost in old_links.items()
+                 if previous[neighbor] == origin and new_links.get(neighbor, INF) > cost]
+        if roots:
+            children = defaultdict(list)
+            for node, prev in enumerate(previous):
+                if prev >= 0:
+                    children[prev].append(node)
+            subtree = set()
+            stack = roots
+            while stack:
+                node = stack.pop()
+                if node not in subtree:
+                    subtree.add(node)
+                    stack.extend(children[node])
+            for node in subtree:
+                old_distances[node] = distances[node]
+                distances[node] = INF
+                previous[node] = -1
+            for node in subtree:
+                best = min((distances[prev] + cost
+                            for prev, cost in self.in_links(node)), default=INF)
+                if best < INF:
+                    distances[node] = best
+                    heapq.heappush(pq, (best, node))
+
+        # Cạnh mới hoặc giảm chi phí: lan truyền các khoảng cách tốt hơn
+        if distances[origin] < INF:
+            for neighbor, cost in new_links.items():
+                new_dist = distances[origin] + cost
+                if cost < old_links.get(neighbor, INF) and new_dist < distances[neighbor]:
+                    old_distances.setdefault(neighbor, distances[neighbor])
+                    distances[neighbor] = new_dist
+                    heapq.heappush(pq, (new_dist, neighbor))
 
-        for dst_addr in distances:
-            if dst_addr == self.addr:
-                continue
-
-            if distances[dst_addr] == float('inf'):
+        while pq:
+            current_dist, current_node = heapq.heappop(pq)
+            if current_dist > distances[current_node]:
                 continue
+            for neighbor_node, cost in self.spf_links.neighbors(current_node):
+                new_dist = current_dist + cost
+                if new_dist < distances[neighbor_node]:
+                    old_distances.setdefault(neighbor_node, distances[neighbor_node])
+                    distances[neighbor_node] = new_dist
+                    heapq.heappush(pq, (new_dist, neighbor_node))
 
-            # Truy ngược từ đích về self.addr để tìm đường đi ngắn nhất.
-            path = []
-            current = dst_addr
-            while current != self.addr and current in previous:
-                path.append(current)
-                current = previous[current]
-
-            if current != self.addr:  # Khôngthấy đường đi đến đích
+        # Chọn lại nút trước cho các nút có khoảng cách hoặc cạnh vào thay đổi
+        affected = set(old_distances) | set(old_links) | set(new_links)
+        for node, old_dist in old_distances.items():
+            if distances[node] != old_dist:
+                affected.update(neighbor for neighbor, _ in self.spf_links.neighbors(node))
+        for node in affected:
+            if node == self.self_id:
                 continue
-
-            if not path:  # đích là neighbor
+            if distances[node] < INF:
+                previous[node] = self.best_previous(node)
+            else:
+                previous[node] = -1
+
+    def update_link_state(self, origin, links):
+        # Cập nhật LSDB; SPT sẽ được tính lại trong handle_time (gom nhiều LSP một lần)
+        if not self.link_state_db.set(origin, ROWS.get(links)):
+            return False
+        self.dirty_origins[origin] = None
+        return True
+
+    def run_spf(self):
+        self.grow()
+        dirty_origins = list(self.dirty_origins)
+        self.dirty_origins = {}
+        self.spf_pending_since = None
+        # Quá nhiều thay đổi cùng lúc thì tính lại toàn bộ sẽ nhanh hơn
+        if len(dirty_origins) > max(1, len(self.spf_links) // 4):
+            self.dijkstra()
+            return
+        for origin in dirty_origins:
+            self.incremental_spf(origin)
+        self.route_computations += 1
+        self.update_forwarding_table()
+
+    def update_forwarding_table(self):
+        # Xây dựng bảng chuyển tiếp: next hop của một đích là next hop của nút trước nó
+        ports: Dict[int, int] = {}
+        for port, neighbor in self.neighbors.items():
+            ports.setdefault(self.addresses.intern(neighbor), port)
+        previous = self.previous
+        first_hops = array('i', [-1]) * len(previous)
+        new_forwarding_table = array('i', [-1]) * len(previous)
+
+        for dst_id, prev in enumerate(previous):
+            if prev < 0:
                 continue
-
-            first_hop = path[-1]
-
-            for port, neighbor in self.neighbors.items():
-                if neighbor == first_hop:
-                    new_forwarding_table[dst_addr] = port
+            chain = []
+            current = dst_id
+            while first_hops[current] < 0:
+                prev = previous[current]
+                if prev == self.self_id:  # đích là neighbor
+                    first_hops[current] = current
                     break
+                chain.append(current)
+                current = prev
+            first_hop = first_hops[current]
+            for node in chain:
+                first_hops[node] = first_hop
+
+            new_forwarding_table[dst_id] = ports.get(first_hop, -1)
 
         self.forwarding_table = new_forwarding_table
+        if self.ecmp:
+            self.update_next_hops(ports)
+
+    def update_next_hops(self, ports):
+        # ECMP: tập next hop của một đích là hợp các tập next hop của mọi nút trước
+        # cùng chi phí; duyệt theo khoảng cách tăng dần để các nút trước đã được tính
+        distances = self.distances
+        first_hops: Dict[int, frozenset] = {}
+        next_hops: List[Tuple[int, ...]] = [()] * len(distances)
+        reachable = [node for node, dist in enumerate(distances)
+                     if dist < INF and node != self.self_id]
+        for node in sorted(reachable, key=distances.__getitem__):
+            hops = set()
+            for prev in self.equal_cost_previous(node):
+                if prev == self.self_id:
+                    hops.add(node)
+                else:
+                    hops.update(first_hops.get(prev, ()))
+            first_hops[node] = frozenset(hops)
+            next_hops[node] = tuple(sorted(ports[hop] for hop in hops if hop in ports))
+        self.next_hops = next_hops
 
     def create_packet(self, content_input):
-        # Chuyển đổi thành {endpoint: cost} cho routing packet
-        links_for_payload = {endpoint: cost for (port, endpoint), cost in content_input.items()}
-        payload_dict = {
-            'links': links_for_payload,
-            'seq_num': self.seq_num
-        }
-        content_str = json.dumps(payload_dict)
-        #print(content_str)
+        # Chuyển đổi thành {endpoint_id: cost} và mã hóa nhị phân cho routing packet
+        links_for_payload = {self.addresses.intern(endpoint): cost
+                             for (port, endpoint), cost in content_input.items()}
+        content_str = encode(self.self_id, self.seq_num, links_for_payload)
         return Packet(False, self.addr, None, content_str)
 
     def broadcast_link_state(self):
@@ -114,90 +337,158 @@ class LSrouter(Router):
         self.seq_num += 1
 
         # Cập nhật LSDB của bản thân
-        current_self_links = {endpoint: cost for (port, endpoint), cost in self.link_costs.items()}
-        self.link_state_db[self.addr] = current_self_links
+        self.update_self_link_state()
 
         # Lưu trữ sequence number bản thân vào LSDB
-        self.sequence_numbers[self.addr] = self.seq_num
+        self.sequence_numbers[self.self_id] = self.seq_num
 
-        # Tạo và gửi LSP
+        # Tạo và gửi LSP đến tất cả các neighbor
         packet = self.create_packet(self.link_costs)
+        self.flood(self.self_id, self.seq_num, packet, ())
+        self.last_time = self.now
+        self.lsp_pending = False
 
-        # Gửi đến tất cả các neighbor
+    def flood(self, origin, seq, packet, skip_ports):
+        # Gửi LSP đến các neighbor (trừ skip_ports) và chờ ACK của các router
         for port in list(self.neighbors.keys()):
-            try:
-                self.send(port, packet)
-            except KeyError:
-                pass
+            if port in skip_ports:
+                continue
+            self.send(port, packet)
+            if port in self.router_ports:
+                self.retransmit[port][origin] = (seq, packet, self.now)
+
+    def acknowledge(self, port, origin, seq):
+        # ACK được gom lại và gửi một lần ở cuối vòng lặp
+        self.pending_acks.setdefault(port, {})[origin] = seq
 
     def handle_packet(self, port, packet):
         if packet.is_traceroute:
             # Xử lý traceroute packet
             if packet.dst_addr == self.addr:
                 return
-            elif packet.dst_addr in self.forwarding_table:
-                # Chuyển tiếp đến đích
-                try:
-                    next_port = self.forwarding_table[packet.dst_addr]
+            dst_id = self.addresses.ids.get(packet.dst_addr)
+            if dst_id is not None and dst_id < len(self.forwarding_table):
+                next_port = self.forwarding_table[dst_id]
+                if self.ecmp and len(self.next_hops[dst_id]) > 1:
+                    next_hops = self.next_hops[dst_id]
+                    src_id = self.addresses.ids.get(packet.src_addr, 0)
+                    next_port = next_hops[
+                        flow_hash(src_id, dst_id, self.self_id) % len(next_hops)]
+                if next_port >= 0:
+                    # Chuyển tiếp đến đích; port có thể đã bị xóa sau khi bảng định
+                    # tuyến được tính toán (Router.send bỏ qua)
                     self.send(next_port, packet)
-                except KeyError:
-                    # Port đã bị xóa sau khi bảng định tuyến được tính toán
-                    pass
         else:
-            # Xử lý routing packet (LSP)
+            # Xử lý routing packet (LSP hoặc ACK); chỉ đọc header trước khi kiểm tra seq
             try:
-                content_data = json.loads(packet.content)
-                links_from_packet = content_data.get('links', {})
-                seq_num_from_packet = content_data.get('seq_num', -1)
-            except (json.JSONDecodeError, KeyError):
+                src_id, seq_num_from_packet = peek(packet.content)
+            except (struct.error, TypeError, UnicodeEncodeError):
                 # Lỗi phân tích nội dung packet
                 return
+            if port not in self.router_ports and port in self.neighbors:
+                self.router_ports.add(port)
+                self.retransmit[port] = {}
+
+            if seq_num_from_packet == ACK:
+                _, _, acked = decode(packet.content)
+                retransmit = self.retransmit.get(port, {})
+                for origin, seq in acked.items():
+                    entry = retransmit.get(origin)
+                    if entry is not None and entry[0] <= seq:
+                        del retransmit[origin]
+                return
+            if seq_num_from_packet == SUMMARY:
+                self.handle_summary(port, decode(packet.content)[2])
+                return
 
-            # Lấy thông tin nguồn vs stt hiện tại
-            src_addr = packet.src_addr
-            current_seq = self.sequence_numbers.get(src_addr, -1)
+            if src_id == self.self_id:
+                # LSP của chính mình từ trước khi khởi động lại (router mất trạng
+                # thái): tiếp tục đánh số từ seq lớn hơn để các router khác nhận LSP mới
+                if seq_num_from_packet > self.seq_num:
+                    self.seq_num = seq_num_from_packet
+                    self.broadcast_link_state()
+                else:
+                    self.acknowledge(port, src_id, seq_num_from_packet)
+                return
+
+            # Neighbor đã có LSP này (hoặc bản mới hơn): ACK ngầm định
+            retransmit = self.retransmit.get(port)
+            entry = retransmit.get(src_id) if retransmit else None
+            implicit_ack = entry is not None and entry[0] <= seq_num_from_packet
+            if implicit_ack:
+                del retransmit[src_id]
+
+            # Lấy stt hiện tại của nguồn
+            current_seq = self.sequence_numbers.get(src_id, -1)
 
             # Kiểm tra sequence number
+            if seq_num_from_packet < current_seq and \
+                    self.neighbors.get(port) == self.addresses.names[src_id]:
+                # Neighbor gửi LSP cũ hơn bản trong LSDB: nó vừa khởi động lại, gửi lại
+                # bản mới hơn để nó biết seq cũ của mình
+                links = dict(self.link_state_db.neighbors(src_id))
+                self.send(port, Packet(False, self.addr, None,
+                                       encode(src_id, current_seq, links)))
+                return
             if seq_num_from_packet <= current_seq:
+                if seq_num_from_packet == current_seq:
+                    # Bản trùng: neighbor đã có LSP này nên không cần gửi cho nó nữa
+                    queued = self.flood_queue.get(src_id)
+                    if queued is not None and queued[0].content == packet.content:
+                        queued[1].add(port)
+                # Bản trùng của một LSP mình đã gửi không cần ACK
+                if not implicit_ack:
+                    self.acknowledge(port, src_id, seq_num_from_packet)
                 return
 
             # Cập nhật sequence number
-            self.sequence_numbers[src_addr] = seq_num_from_packet
-
-            # Chuẩn hóa links và cập nhật LSDB
-            updated_links = {str(neighbor): float(cost) for neighbor, cost in links_from_packet.items()}
-
-            # Kiểm tra xem có sự thay đổi thực sự không
-            old_links = self.link_state_db.get(src_addr, {})
-            links_changed = (old_links != updated_links)
-
-            # Cập nhật LSDB
-            self.link_state_db[src_addr] = updated_links
-
-            if links_changed:
-                self.dijkstra()
-
-            # Luôn chuyển tiếp LSP đến các neighbor khác (trừ nguồn)
-            for out_port in list(self.neighbors.keys()):
-                if out_port != port:  # Không gửi lại đến port đã nhận
-                    try:
-                        self.send(out_port, packet)
-                    except KeyError:
-                        # Port đã bị xóa sau khi bắt đầu loop
-                        continue
+            self.sequence_numbers[src_id] = seq_num_from_packet
+
+            # Giải mã links (mỗi LSP chỉ giải mã một lần) và cập nhật LSDB nếu có sự
+            # thay đổi thực sự
+            _, _, updated_links = DECODE_CACHE.decode(packet.content)
+            self.update_link_state(src_id, updated_links)
+
+            # Chuyển tiếp LSP đến các neighbor khác ở cuối vòng lặp (trừ nguồn và các
+            # neighbor đã gửi bản trùng)
+            self.acknowledge(port, src_id, seq_num_from_packet)
+            self.flood_queue[src_id] = (packet, {port})
+
+    def handle_summary(self, port, summary):
+        # Router vừa khởi động lại: LSP tiếp theo phải có seq lớn hơn bản cũ
+        seq = int(summary.get(self.self_id, 0))
+        if seq > self.seq_num:
+            self.seq_num = seq
+            self.lsp_pending = True
+
+        # Gửi các LSP mà neighbor còn thiếu hoặc có bản cũ hơn, và chờ ACK
+        for origin, current_seq in self.sequence_numbers.items():
+            if current_seq <= summary.get(origin, 0):
+                continue
+            links = dict(self.link_state_db.neighbors(origin))
+            packet = Packet(False, self.addr, None, encode(origin, current_seq, links))
+            self.send(port, packet)
+            if port in self.router_ports:
+                self.retransmit[port][origin] = (current_seq, packet, self.now)
 
     def handle_new_link(self, port, endpoint, cost):
         # thêm, hoặc cập nhật
         self.link_costs[(port, endpoint)] = float(cost)
         self.neighbors[port] = endpoint
 
-        # cập nhật LSDB cho mình
-        current_self_links = {endpoint: c for (p, endpoint), c in self.link_costs.items()}
-        self.link_state_db[self.addr] = current_self_links
+        # Đồng bộ LSDB với neighbor mới: gửi tóm tắt (origin, seq), neighbor chỉ gửi
+        # lại các LSP mình còn thiếu
+        summary = encode(self.self_id, SUMMARY, self.sequence_numbers)
+        self.send(port, Packet(False, self.addr, None, summary))
 
-        self.dijkstra()
+        # cập nhật LSDB cho mình; LSP được gửi trong handle_time
+        self.update_self_link_state()
+        self.lsp_pending = True
 
-        self.broadcast_link_state()
+    def update_self_link_state(self):
+        current_self_links = {self.addresses.intern(endpoint): c
+                              for (p, endpoint), c in self.link_costs.items()}
+        self.update_link_state(self.self_id, current_self_links)
 
     def handle_remove_link(self, port):
         # Kiểm tra xem port có tồn tại không
@@ -207,23 +498,60 @@ class LSrouter(Router):
             # Cập nhật link_costs bằng cách lọc ra tất cả ngoại trừ port bị xóa
             self.link_costs = {k: v for k, v in self.link_costs.items() if k[0] != port}
 
-            # Cập nhật LSDB cho chính mình
-            current_self_links = {endpoint: c for (p, endpoint), c in self.link_costs.items()}
-            self.link_state_db[self.addr] = current_self_links
+            self.router_ports.discard(port)
+            self.retransmit.pop(port, None)
+            self.pending_acks.pop(port, None)
 
-            self.dijkstra()
+            # Cập nhật LSDB cho chính mình; LSP được gửi trong handle_time
+            self.update_self_link_state()
+            self.lsp_pending = True
 
+    def handle_time(self, time_ms):
+        self.now = time_ms
+
+        # Flood các LSP mới nhận trong vòng lặp này, rồi gửi các ACK đã gom
+        flood_queue, self.flood_queue = self.flood_queue, {}
+        for origin, (packet, skip_ports) in flood_queue.items():
+            self.flood(origin, self.sequence_numbers[origin], packet, skip_ports)
+        pending_acks, self.pending_acks = self.pending_acks, {}
+        for port, acked in pending_acks.items():
+            self.send(port, Packet(False, self.addr, None,
+                                   encode(self.self_id, ACK, acked)))
+
+        if self.dirty_origins:
+            if self.spf_pending_since is None:
+                self.spf_pending_since = time_ms
+            if time_ms - self.spf_pending_since >= self.spf_hold_time:
+                self.run_spf()
+
+        if self.lsp_pending and time_ms >= self.next_lsp_time:
+            # Sau một khoảng yên lặng, backoff trở về giá trị ban đầu
+            if time_ms - self.last_time >= self.lsp_max_interval:
+                self.lsp_hold = self.lsp_min_interval
+            self.broadcast_link_state()
+            self.next_lsp_time = time_ms + self.lsp_hold
+            self.lsp_hold = min(2 * self.lsp_hold, self.lsp_max_interval)
+        elif time_ms - self.last_time >= self.refresh_time and self.neighbors:
+            # Gửi LSP định kỳ
             self.broadcast_link_state()
 
-    def handle_time(self, time_ms):
-        if time_ms - self.last_time >= self.heartbeat_time:
-            self.last_time = time_ms
-            # Gửi LSP định kỳ nếu có neighbors
-            if self.neighbors:
-                self.broadcast_link_state()
+        # Gửi lại các LSP chưa được ACK
+        for port, retransmit in self.retransmit.items():
+            for origin, (seq, packet, sent_time) in list(retransmit.items()):
+                if time_ms - sent_time >= self.retransmit_time:
+                    self.send(port, packet)
+                    retransmit[origin] = (seq, packet, time_ms)
 
     def __repr__(self):
         return (f"LSrouter(addr={self.addr}, "
                 f"neighbors={list(self.neighbors.values())}, "
                 f"seq_num={self.seq_num}, "
-                f"FT_keys={list(self.forwarding_table.keys())})")
\ No newline at end of file
+                f"FT_keys={[self.addresses.names[dst_id] for dst_id, port in enumerate(self.forwarding_table) if port >= 0]})")
+
+class ECMProuter(LSrouter):
+    # LSrouter chuyển tiếp trên tất cả các đường đi ngắn nhất (ECMP)
+    __slots__ = ()
+
+    def __init__(self, addr, heartbeat_time, addresses=None, **kwargs):
+        kwargs.setdefault("ecmp", True)
+        LSrouter.__init__(self, addr, heartbeat_time, addresses, **kwargs)
@@ -0,0 +1,193 @@
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from metrics import PacketCounter
+from network import Network
+from router import Router
+from topology import TOPOLOGIES, generate
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+FIELDS = [
+    "topology",
+    "size",
+    "router",
+    "routers",
+    "links",
+    "correct",
+    "wall_time_s",
+    "convergence_time_ms",
+    "packets_sent",
+    "routing_packets_sent",
+    "routing_bytes_sent",
+    "route_computations",
+    "peak_memory_mb",
+]
+
+
+def load_router_class(name):
+    """Return the router class for "DV", "LS", "ECMP" (LS with ECMP), "Oracle" or
+    "Router".
+    """
+    if name == "DV":
+        from DVrouter import DVrouter
+
+        return DVrouter
+    if name == "LS":
+        from LSrouter import LSrouter
+
+        return LSrouter
+    if name == "ECMP":
+        from LSrouter import ECMProuter
+
+        return ECMProuter
+    if name == "Oracle":
+        from oracle import OracleRouter
+
+        return OracleRouter
+    return Router
+
+
+def convergence_time(report):
+    """Return the time (in ms since the start) at which routes converged after the last
+    change, from a report of `Network.get_report`, or None if they did not converge.
+    """
+    last_change = report["changes"][-1]
+    if last_change["convergence_ms"] is None:
+        return None
+    return last_change["time_ms"] + last_change["convergence_ms"]
+
+
+def run_case(scenario_path, router_name, backend):
+    """Run one simulation and return its measurements."""
+    net = Network(scenario_path, load_router_class(router_name), backend=backend)
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        net.run()
+    wall_time = time.perf_counter() - start
+
+    totals = PacketCounter()
+    for link in net.all_links:
+        for counter in link.counters.values():
+            totals.add(counter)
+    correct = len(net.routes) == len(net.clients) ** 2 and all(
+        is_good for _, is_good, _ in net.routes.values()
+    )
+    peak_memory = None
+    if resource is not None:
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    return {
+        "routers": len(net.routers),
+        "links": len(net.links),
+        "correct": correct,
+        "wall_time_s": round(wall_time, 3),
+        "convergence_time_ms": convergence_time(net.get_report()),
+        "packets_sent": totals.packets,
+        "routing_packets_sent": totals.routing_packets,
+        "routing_bytes_sent": totals.routing_bytes,
+        "route_computations": sum(
+            router.route_computations for router in net.routers.values()
+        ),
+        "peak_memory_mb": peak_memory and round(peak_memory, 1),
+    }
+
+
+def _run_case_in_child(conn, scenario_path, router_name, backend):
+    conn.send(run_case(scenario_path, router_name, backend))
+    conn.close()
+
+
+def run_isolated(scenario_path, router_name, backend):
+    """Run `run_case` in a fresh process so that peak memory is per simulation."""
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe()
+    process = ctx.Process(
+        target=_run_case_in_child,
+        args=(child_conn, scenario_path, router_name, backend),
+    )
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark routers on generated network simulations."
+    )
+    parser.add_argument(
+        "--topologies",
+        nargs="+",
+        choices=sorted(TOPOLOGIES),
+        default=["ring", "grid", "fat-tree", "random-geometric", "scale-free"],
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 50, 100])
+    parser.add_argument(
+        "--routers", nargs="+", choices=["DV", "LS", "ECMP", "Oracle", "Router"], default=["LS"]
+    )
+    parser.add_argument(
+        "--backend", choices=["threads", "asyncio", "virtual"], default="virtual"
+    )
+    parser.add_argument("--clients", type=int, default=8, help="Clients per network.")
+    parser.add_argument("--flaps", type=int, default=0, help="Link flaps per network.")
+    parser.add_argument("--max-cost", type=int, default=10, help="Maximum link cost.")
+    parser.add_argument(
+        "--asymmetric", action="store_true", help="Use different costs per direction."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument(
+        "--scenario-dir", help="Keep the generated JSON files in this directory."
+    )
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("-o", "--output", help="Output path (default: stdout).")
+    args = parser.parse_args()
+
+    scenario_dir = args.scenario_dir or tempfile.mkdtemp(prefix="routing-bench-")
+    os.makedirs(scenario_dir, exist_ok=True)
+    results = []
+    for topology in args.topologies:
+        for size in args.sizes:
+            scenario = generate(
+                topology,
+                size,
+                num_clients=args.clients,
+                seed=args.seed,
+                max_cost=args.max_cost,
+                asymmetric=args.asymmetric,
+                flaps=args.flaps,
+            )
+            path = os.path.join(scenario_dir, f"{topology}_{size}.json")
+            with open(path, "w") as f:
+                json.dump(scenario, f)
+            for router_name in args.routers:
+                result = {"topology": topology, "size": size, "router": router_name}
+                result.update(run_isolated(path, router_name, args.backend))
+                results.append(result)
+                print(json.dumps(result), file=sys.stderr)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    if args.format == "csv":
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    else:
+        json.dump(results, out, indent=2)
+        out.write("\n")
+    if args.output:
+        out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import heapq
+import random
+
+# A change is a list [time, target, kind], as in the "changes" of the JSON format:
+# - [time, [addr1, addr2, p1, p2, c12, c21], "up"] adds a link,
+# - [time, [addr1, addr2], "down"] removes a link,
+# - [time, [addr1, addr2, c12, c21], "cost"] changes the costs of a link,
+# - [time, addr, "crash"] stops a router and takes all its links down,
+# - [time, addr, "restart"] replaces a crashed router with a new one, with no routing
+#   state, and brings its links back up.
+# Times are in the time unit of the JSON file.
+
+
+class ChangeSchedule:
+    """
+    The ChangeSchedule class merges several sources of changes (lists, iterators or
+    generators, each in time order) into a single stream in time order, lazily: only
+    the next change of each source is held in memory, so sources can be endless.
+
+    Changes at the same time are ordered by source (in the order they were added),
+    then by position in their source, never by comparing their targets.
+    """
+
+    def __init__(self, sources=()):
+        self._heap = []  # (time, source index, position, change, iterator)
+        self._num_sources = 0
+        self.popped = 0  # Number of changes taken from the schedule so far
+        for source in sources:
+            self.add(source)
+
+    def add(self, source):
+        """Add a source of changes in time order."""
+        self._push(self._num_sources, 0, iter(source), None)
+        self._num_sources += 1
+
+    def _push(self, index, position, iterator, last_time):
+        change = next(iterator, None)
+        if change is None:
+            return
+        if last_time is not None and change[0] < last_time:
+            raise ValueError(f"change {change} is earlier than the previous one")
+        heapq.heappush(self._heap, (change[0], index, position, change, iterator))
+
+    def peek(self):
+        """Return the next change without removing it, or None if there is none."""
+        return self._heap[0][3] if self._heap else None
+
+    def pop(self):
+        """Remove and return the next change, or None if there is none."""
+        if not self._heap:
+            return None
+        time, index, position, change, iterator = heapq.heappop(self._heap)
+        self._push(index, position + 1, iterator, time)
+        self.popped += 1
+        return change
+
+    @property
+    def exhausted(self):
+        """Whether all changes have been taken from the schedule."""
+        return not self._heap
+
+    def __iter__(self):
+        while self._heap:
+            yield self.pop()
+
+
+def sorted_changes(changes):
+    """Return a list of changes sorted by time, keeping the order of equal times."""
+    return sorted(changes, key=lambda change: change[0])
+
+
+def link_costs(target, change):
+    """Return the link costs set by a change: [c12, c21] for "up" and "cost" changes,
+    and an empty list for the others.
+    """
+    if change == "up":
+        return target[4:6]
+    if change == "cost":
+        return target[2:4]
+    return []
+
+
+def final_links(links, changes):
+    """Return the links that are up after applying all `changes` in order.
+
+    Changes are applied as `Network.apply_change` does: links of a crashed router go
+    down and come back up when it restarts, and links brought up or given new costs
+    while an endpoint is crashed only come up when it restarts.
+    """
+    current = {(link[0], link[1]): list(link) for link in links}
+    crashed = {}  # Crashed router: {key: link} to bring up when it restarts
+
+    def link_up(link):
+        key = (link[0], link[1])
+        for addr in key:
+            if addr in crashed:
+                crashed[addr][key] = list(link)
+                return
+        current[key] = list(link)
+
+    for _, target, change in sorted_changes(changes):
+        if change == "up":
+            link_up(target)
+        elif change == "down":
+            key = (target[0], target[1])
+            if current.pop(key, None) is None:
+                for saved_links in crashed.values():
+                    saved_links.pop(key, None)
+        elif change == "cost":
+            key = (target[0], target[1])
+            for saved_links in [current, *crashed.values()]:
+                if key in saved_links:
+                    saved_links[key][4:] = target[2:4]
+        elif change == "crash" and target not in crashed:
+            keys = [key for key in current if target in key]
+            crashed[target] = {key: current.pop(key) for key in keys}
+        elif change == "restart" and target in crashed:
+            for link in crashed.pop(target).values():
+                link_up(link)
+    return list(current.values())
+
+
+def _failures(count, mtbf, mttr, rng, start, until):
+    """Generate (time, index, is_up) events of `count` elements that fail and get
+    repaired at random, in time order. See `link_flaps`.
+    """
+    events = [(start + rng.expovariate(1 / mtbf), i, False) for i in range(count)]
+    heapq.heapify(events)
+    while events:
+        time, i, repair = heapq.heappop(events)
+        if repair:
+            yield round(time, 3), i, True
+            next_failure = time + rng.expovariate(1 / mtbf)
+            if next_failure <= until:
+                heapq.heappush(events, (next_failure, i, False))
+        elif time <= until:
+            yield round(time, 3), i, False
+            heapq.heappush(events, (time + rng.expovariate(1 / mttr), i, True))
+
+
+def link_flaps(links, mtbf, mttr, seed=0, start=0, until=float("inf")):
+    """Generate random failures and repairs of `links`.
+
+    Every link fails after a time drawn from an exponential distribution with mean
+    `mtbf` (mean time between failures) and comes back up with the same costs after a
+    time drawn with mean `mttr` (mean time to repair). No failure starts after `until`,
+    and every failed link is repaired, so the final network is the original one.
+
+    Parameters
+    ----------
+    links
+        Links in the format of the JSON file, [addr1, addr2, p1, p2, c12, c21].
+    mtbf, mttr
+        In the time unit of the JSON file.
+    seed
+        The seed of the random generator, so that the churn is reproducible.
+    start
+        The time before which no link fails.
+    until
+        The time after which no link fails.
+    """
+    rng = random.Random(seed)
+    for time, i, is_up in _failures(len(links), mtbf, mttr, rng, start, until):
+        link = links[i]
+        if is_up:
+            yield [time, list(link), "up"]
+        else:
+            yield [time, [link[0], link[1]], "down"]
+
+
+def cost_changes(
+    links, interval, duration, max_cost=10, seed=0, start=0, until=float("inf")
+):
+    """Generate temporary random changes of the costs of `links`.
+
+    Every `interval` on average (exponentially distributed), a random link that is not
+    already changed gets random costs between 1 and `max_cost` in each direction, and
+    its original costs are restored `duration` later. No change starts after `until`.
+
+    `links` are in the format of the JSON file, and times are in its time unit.
+    """
+    rng = random.Random(seed)
+    restores = []  # (time, index of the link)
+    changed = set()
+    time = start + rng.expovariate(1 / interval)
+    while time <= until or restores:
+        if restores and (restores[0][0] <= time or time > until):
+            restore_time, i = heapq.heappop(restores)
+            changed.discard(i)
+            addr1, addr2, _, _, c12, c21 = links[i]
+            yield [round(restore_time, 3), [addr1, addr2, c12, c21], "cost"]
+            continue
+        i = rng.randrange(len(links))
+        if i not in changed:
+            changed.add(i)
+            c12, c21 = rng.randint(1, max_cost), rng.randint(1, max_cost)
+            yield [round(time, 3), [links[i][0], links[i][1], c12, c21], "cost"]
+            heapq.heappush(restores, (time + duration, i))
+        time += rng.expovariate(1 / interval)
+
+
+def router_failures(routers, mtbf, mttr, seed=0, start=0, until=float("inf")):
+    """Generate random crashes and restarts of `routers`.
+
+    A crashed router loses all its links and its routing state, and restarts with all
+    its links, except those to routers that are still crashed. Times are drawn as in
+    `link_flaps`.
+    """
+    rng = random.Random(seed)
+    for time, i, is_up in _failures(len(routers), mtbf, mttr, rng, start, until):
+        yield [time, routers[i], "restart" if is_up else "crash"]
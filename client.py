@@ -1,24 +1,59 @@
 import time
 import queue
+import threading
 from packet import Packet
+from scheduler import wait_event
 
 
 class Client:
     """
     The Client class sends periodic "traceroute" packets and returns routes that
     these packets take back to the network object.
+
+    Parameters
+    ----------
+    addr
+        The address of this client.
+    all_clients
+        The list of addresses of all clients.
+    send_rate
+        The interval (in ms) between two batches of traceroute packets.
+    update_fn
+        Called as `update_fn(src, dst, route, sent_time)` when a traceroute arrives,
+        and with an empty route for every traceroute sent unless `sent_fn` is given.
+    sent_fn
+        Optional, called once per batch as `sent_fn(src, dsts)` with the list of
+        destinations traceroute packets were just sent to.
+    probe_fanout
+        If provided, every batch only probes this many destinations, taken in turn
+        from `all_clients` (starting after this client), so that every destination
+        is probed once every `len(all_clients) / probe_fanout` batches.
     """
 
-    def __init__(self, addr, all_clients, send_rate, update_fn):
+    def __init__(
+        self, addr, all_clients, send_rate, update_fn, sent_fn=None, probe_fanout=None
+    ):
         self.addr = addr
-        self.all_clients = all_clients
+        self.all_clients = list(all_clients)
         self.send_rate = send_rate
         self.last_time = 0
         self.link = None
         self.update_fn = update_fn
+        self.sent_fn = sent_fn
+        self.probe_fanout = probe_fanout
+        # Index in `all_clients` of the next destination to probe
+        self.next_probe = (
+            self.all_clients.index(addr) + 1 if addr in self.all_clients else 0
+        )
         self.sending = True
         self.link_changes = queue.Queue()
         self.keep_running = True
+        self.wakeup = threading.Event()  # See Router.wakeup
+        self.tick_interval = send_rate / 10
+
+    def notify(self):
+        """Wake the main loop of the client up."""
+        self.wakeup.set()
 
     def change_link(self, change):
         """Add a link to the client.
@@ -26,6 +61,7 @@ class Client:
         The change argument should be a tuple ('add', link).
         """
         self.link_changes.put(change)
+        self.notify()
 
     def handle_packet(self, packet):
         """Handle receiving a packet.
@@ -34,38 +70,76 @@ class Client:
         network object with its route.
         """
         if packet.kind == Packet.TRACEROUTE:
-            self.update_fn(packet.src_addr, packet.dst_addr, packet.route)
+            self.update_fn(
+                packet.src_addr, packet.dst_addr, packet.route, packet.sent_time
+            )
 
-    def send_traceroutes(self):
-        """Send "traceroute" packets to every other client in the network."""
-        for dst_client in self.all_clients:
+    def next_destinations(self):
+        """Return the destinations of the next batch of traceroute packets."""
+        num_clients = len(self.all_clients)
+        if self.probe_fanout is None or self.probe_fanout >= num_clients:
+            return self.all_clients
+        start = self.next_probe
+        self.next_probe = (start + self.probe_fanout) % num_clients
+        return [
+            self.all_clients[(start + i) % num_clients]
+            for i in range(self.probe_fanout)
+        ]
+
+    def send_traceroutes(self, time_ms=None, dst_clients=None):
+        """Send "traceroute" packets to `dst_clients` (by default, every client in the
+        network).
+        """
+        if dst_clients is None:
+            dst_clients = self.all_clients
+        link = self.link
+        for dst_client in dst_clients:
             packet = Packet(Packet.TRACEROUTE, self.addr, dst_client)
-            if self.link:
-                self.link.send(packet, self.addr)
-            self.update_fn(packet.src_addr, packet.dst_addr, [])
+            packet.sent_time = time_ms
+            if link:
+                link.send(packet, self.addr)
+        if self.sent_fn is not None:
+            self.sent_fn(self.addr, dst_clients)
+        else:
+            for dst_client in dst_clients:
+                self.update_fn(self.addr, dst_client, [])
 
     def handle_time(self, time_ms):
         """Send traceroute packets regularly."""
         if self.sending and (time_ms - self.last_time > self.send_rate):
-            self.send_traceroutes()
+            self.send_traceroutes(time_ms, self.next_destinations())
             self.last_time = time_ms
 
     def run(self):
         """Main loop of client."""
         while self.keep_running:
-            time.sleep(0.1)
-            time_ms = int(round(time.time() * 1000))
+            self.wakeup.wait(self.tick_interval / 1000)
+            self.wakeup.clear()
+            self.tick(int(round(time.time() * 1000)))
+
+    async def run_async(self):
+        """Main loop of client as a coroutine. `wakeup` must be an `asyncio.Event`."""
+        while self.keep_running:
+            await wait_event(self.wakeup, self.tick_interval / 1000)
+            self.wakeup.clear()
+            self.tick(int(round(time.time() * 1000)))
+
+    def tick(self, time_ms):
+        """Apply pending link changes, process all received packets and the time."""
+        while True:
             try:
                 change = self.link_changes.get_nowait()
-                if change[0] == "add":
-                    self.link = change[1]
             except queue.Empty:
-                pass
-            if self.link:
+                break
+            if change[0] == "add":
+                self.link = change[1]
+                self.link.attach(self.addr, self.notify)
+        if self.link:
+            packet = self.link.recv(self.addr)
+            while packet:
+                self.handle_packet(packet)
                 packet = self.link.recv(self.addr)
-                if packet:
-                    self.handle_packet(packet)
-            self.handle_time(time_ms)
+        self.handle_time(time_ms)
 
     def last_send(self):
         """Send one final batch of "traceroute" packets."""
@@ -0,0 +1,139 @@
+import json
+from collections import defaultdict
+
+# A trace is a JSON Lines file. The first line is a header object with the settings
+# of the run. Every other line is an event, a list:
+# - ["change", time_ms, change] when a change ([time, target, kind], see `changes.py`)
+#   is applied,
+# - ["tick", time_ms, addr, received, sent, route_computations] when an iteration of
+#   the main loop of router `addr` received, sent or computed something, with the
+#   number of packets received and sent and of route computations in that iteration.
+# Times are virtual times in ms, so a trace is the same for every run of the same
+# scenario with the same settings.
+
+WORK = ("received", "sent", "route_computations")
+
+
+class TraceWriter:
+    """
+    The TraceWriter class writes the events of a run to a trace file.
+
+    Parameters
+    ----------
+    path
+        The path of the trace file.
+    header
+        A dict with the settings of the run, written on the first line.
+    """
+
+    def __init__(self, path, header):
+        self.file = open(path, "w")
+        self.file.write(json.dumps(header) + "\n")
+
+    def record(self, event):
+        """Write one event."""
+        self.file.write(json.dumps(event) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def read_header(path):
+    """Return the header of the trace file at `path`."""
+    with open(path, "r") as f:
+        return json.loads(f.readline())
+
+
+def read_events(path):
+    """Generate the events of the trace file at `path`, lazily."""
+    with open(path, "r") as f:
+        f.readline()
+        for line in f:
+            yield json.loads(line)
+
+
+def read_changes(path):
+    """Generate the changes applied in the trace file at `path`, in time order."""
+    for event in read_events(path):
+        if event[0] == "change":
+            yield event[2]
+
+
+class TraceReplay:
+    """
+    The TraceReplay class compares the events of a run with those of a trace, one
+    event at a time, to find where a modified router starts doing different work.
+
+    A replay runs the scenario of the trace with the same settings and the same changes
+    (including random churn), so events only differ once a router behaves differently.
+    Work is also summed by router over the whole run, for the run and for the trace.
+
+    Parameters
+    ----------
+    path
+        The path of the trace file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        self.events = read_events(path)
+        self.num_events = 0  # Events of the run so far
+        self.divergence = None  # (index, expected event, actual event), if any
+        self.expected = defaultdict(lambda: [0] * len(WORK))  # Work by router
+        self.actual = defaultdict(lambda: [0] * len(WORK))
+
+    def record(self, event):
+        """Compare one event of the run with the next event of the trace."""
+        expected = next(self.events, None) if self.divergence is None else None
+        if self.divergence is None and event != expected:
+            self.divergence = (self.num_events, expected, event)
+        self.num_events += 1
+        if event[0] == "tick":
+            self.add_work(self.actual, event)
+        if expected is not None and expected[0] == "tick":
+            self.add_work(self.expected, expected)
+
+    @staticmethod
+    def add_work(totals, event):
+        work = totals[event[2]]
+        for i, count in enumerate(event[3:]):
+            work[i] += count
+
+    def close(self):
+        """Read the rest of the trace, after the end of the run."""
+        for expected in self.events:
+            if self.divergence is None:
+                self.divergence = (self.num_events, expected, None)
+            if expected[0] == "tick":
+                self.add_work(self.expected, expected)
+
+    def get_summary(self):
+        """Create a string with the first event that differs, if any, and the work of
+        every router that differs from the trace.
+        """
+        lines = [f"Replay of {self.path}: {self.num_events} events"]
+        if self.divergence is None:
+            lines.append("Identical to the trace")
+            return "\n".join(lines)
+        index, expected, actual = self.divergence
+        lines.append(f"First difference at event {index}:")
+        lines.append(f"  trace: {json.dumps(expected)}")
+        lines.append(f"  run:   {json.dumps(actual)}")
+        lines.append("Work by router (trace -> run):")
+        for addr in sorted(self.expected.keys() | self.actual.keys()):
+            expected_work, actual_work = self.expected[addr], self.actual[addr]
+            if expected_work != actual_work:
+                work = ", ".join(
+                    f"{name} {before} -> {after}"
+                    for name, before, after in zip(WORK, expected_work, actual_work)
+                )
+                lines.append(f"  {addr}: {work}")
+        expected_total = [sum(work) for work in zip(*self.expected.values())]
+        actual_total = [sum(work) for work in zip(*self.actual.values())]
+        work = ", ".join(
+            f"{name} {before} -> {after}"
+            for name, before, after in zip(WORK, expected_total, actual_total)
+        )
+        lines.append(f"  total: {work}")
+        return "\n".join(lines)
@@ -1,7 +1,10 @@
 import _thread
+import random
 import sys
 import queue
 import time
+from metrics import PacketCounter
+from packettrace import RECV, SEND
 
 
 class Link:
@@ -15,9 +18,23 @@ class Link:
         The addresses of the two endpoints of the link.
     l12, l21
         The latencies (in ms) in the e1->e2 and e2->e1 directions, respectively.
+    scheduler
+        An optional scheduler with `now()` and `call_at(time_ms, fn, *args)` methods,
+        usually shared by all links of a network. If provided, packets are delivered by
+        the scheduler instead of by a new thread per packet, and packets sent in the
+        same direction are delivered in the order they were sent.
+    jitter
+        If provided, every packet is delayed by a random extra time between 0 and
+        `jitter` (in the same unit as `l12` and `l21`), still in order per direction.
+    seed
+        The seed of the random jitter, e.g. a string. Each direction draws from its
+        own generator, so the delays in one direction only depend on the packets sent
+        in that direction.
     """
 
-    def __init__(self, e1, e2, l12, l21, latency):
+    def __init__(
+        self, e1, e2, l12, l21, latency, scheduler=None, jitter=0, seed=None
+    ):
         self.q12 = queue.Queue()
         self.q21 = queue.Queue()
         self.l12 = l12 * latency
@@ -25,6 +42,26 @@ class Link:
         self.latency_multiplier = latency
         self.e1 = e1
         self.e2 = e2
+        self.scheduler = scheduler
+        self.next12 = 0  # Earliest delivery times that preserve per-direction order
+        self.next21 = 0
+        self.receivers = {}  # Callbacks notifying endpoints of arrivals, by address
+        # Packets sent on the link, by sending endpoint
+        self.counters = {e1: PacketCounter(), e2: PacketCounter()}
+        self.jitter = jitter * latency
+        self.rngs = {}  # Random generators of the jitter, by sending endpoint
+        if jitter:
+            self.rngs = {
+                e1: random.Random(f"{seed}:{e1}:{e2}"),
+                e2: random.Random(f"{seed}:{e2}:{e1}"),
+            }
+        # Set by `packettrace.PacketRecorder.add_link` to record packets
+        self.recorder = None
+        self.trace_id = None
+
+    def attach(self, addr, notify):
+        """Call `notify()` whenever a packet arrives at endpoint `addr`."""
+        self.receivers[addr] = notify
 
     def _send_helper(self, packet, src):
         """
@@ -34,24 +71,61 @@ class Link:
         if src == self.e1:
             packet.add_to_route(self.e2)
             packet.animate_send(self.e1, self.e2, self.l12)
-            time.sleep(self.l12 / 1000)
-            self.q12.put(packet)
+            time.sleep(self.delay(self.l12, src) / 1000)
         elif src == self.e2:
             packet.add_to_route(self.e1)
             packet.animate_send(self.e2, self.e1, self.l21)
-            time.sleep(self.l21 / 1000)
-            self.q21.put(packet)
+            time.sleep(self.delay(self.l21, src) / 1000)
+        self._deliver(packet, src)
         sys.stdout.flush()
 
+    def _deliver(self, packet, src):
+        """Make packet sent from `src` available to the other endpoint."""
+        if src == self.e1:
+            self.q12.put(packet)
+            notify = self.receivers.get(self.e2)
+        elif src == self.e2:
+            self.q21.put(packet)
+            notify = self.receivers.get(self.e1)
+        else:
+            return
+        if notify:
+            notify()
+
     def send(self, packet, src):
         """
         Send packet on link from `src`. Checks that packet content is a string and
-        starts a new thread to send it. `src` must be equal to `self.e1` or `self.e2`.
+        starts a new thread to send it, or schedules its delivery if the link has a
+        scheduler. `src` must be equal to `self.e1` or `self.e2`.
         """
         if packet.content:
             assert isinstance(packet.content, str), "Packet content must be a string"
         p = packet.copy()
-        _thread.start_new_thread(self._send_helper, (p, src))
+        counter = self.counters.get(src)
+        if counter is not None:
+            counter.count(p)
+        if self.recorder is not None:
+            self.recorder.record(SEND, self.trace_id, src != self.e1, p)
+        if self.scheduler is None:
+            _thread.start_new_thread(self._send_helper, (p, src))
+        elif src == self.e1:
+            p.add_to_route(self.e2)
+            p.animate_send(self.e1, self.e2, self.l12)
+            delay = self.delay(self.l12, src)
+            self.next12 = max(self.scheduler.now() + delay, self.next12)
+            self.scheduler.call_at(self.next12, self._deliver, p, src)
+        elif src == self.e2:
+            p.add_to_route(self.e1)
+            p.animate_send(self.e2, self.e1, self.l21)
+            delay = self.delay(self.l21, src)
+            self.next21 = max(self.scheduler.now() + delay, self.next21)
+            self.scheduler.call_at(self.next21, self._deliver, p, src)
+
+    def delay(self, latency, src):
+        """Return the delay of a packet sent from `src`: `latency` plus jitter."""
+        if not self.jitter:
+            return latency
+        return latency + self.rngs[src].random() * self.jitter
 
     def recv(self, dst, timeout=None):
         """
@@ -62,15 +136,19 @@ class Link:
         if dst == self.e1:
             try:
                 packet = self.q21.get_nowait()
-                return packet
             except queue.Empty:
                 return None
+            if self.recorder is not None:
+                self.recorder.record(RECV, self.trace_id, 1, packet)
+            return packet
         elif dst == self.e2:
             try:
                 packet = self.q12.get_nowait()
-                return packet
             except queue.Empty:
                 return None
+            if self.recorder is not None:
+                self.recorder.record(RECV, self.trace_id, 0, packet)
+            return packet
 
     def change_latency(self, src, c):
         """
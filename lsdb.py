@@ -0,0 +1,139 @@
+from array import array
+from bisect import bisect_left
+
+
+class AddressTable:
+    """
+    The AddressTable class interns router and client addresses as small integers, so
+    that routing state can be stored in compact arrays indexed by address id.
+
+    Every network has its own table, shared by all its routers, so ids only grow
+    with the addresses of that network.
+    """
+
+    __slots__ = ("ids", "names")
+
+    def __init__(self):
+        self.ids = {}  # Address ids indexed by address
+        self.names = []  # Addresses indexed by address id
+
+    def intern(self, addr):
+        """Return the id of `addr`, assigning the next free id if it is new."""
+        try:
+            return self.ids[addr]
+        except KeyError:
+            addr_id = len(self.names)
+            self.ids[addr] = addr_id
+            self.names.append(addr)
+            return addr_id
+
+    def __len__(self):
+        return len(self.names)
+
+
+EMPTY_ROW = (array("i"), array("d"))
+
+
+def make_row(links):
+    """Create an adjacency row from a dict {neighbor id: cost}.
+
+    A row is a pair of arrays (neighbor ids, costs) sorted by neighbor id. Rows are never
+    modified once created, so they can be shared.
+    """
+    ids = sorted(links)
+    return array("i", ids), array("d", [links[i] for i in ids])
+
+
+class RowCache:
+    """
+    The RowCache class shares identical adjacency rows and id arrays between all
+    routers of a network, so that an LSP received by every router is stored only once.
+
+    Parameters
+    ----------
+    max_size
+        The cache is emptied when it holds this many entries.
+    """
+
+    __slots__ = ("rows", "ids", "max_size")
+
+    def __init__(self, max_size=1 << 16):
+        self.rows = {}
+        self.ids = {}
+        self.max_size = max_size
+
+    def _lookup(self, cache, key, create, arg):
+        value = cache.get(key)
+        if value is None:
+            if len(cache) >= self.max_size:
+                cache.clear()
+            value = create(arg)
+            cache[key] = value
+        return value
+
+    def get(self, links):
+        """Return a row for the dict {neighbor id: cost}, see `make_row`."""
+        return self._lookup(self.rows, tuple(sorted(links.items())), make_row, links)
+
+    def get_ids(self, ids):
+        """Return an array('i') of the sorted tuple of ids `ids`."""
+        return self._lookup(self.ids, ids, make_ids, ids)
+
+
+def make_ids(ids):
+    return array("i", ids)
+
+
+ROWS = RowCache()
+
+
+class LinkStateDB:
+    """
+    The LinkStateDB class stores the links advertised by every router as adjacency rows
+    (see `make_row`) in a list indexed by the id of the advertising router.
+    """
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows=None):
+        self.rows = rows if rows is not None else []
+
+    def __contains__(self, origin):
+        return origin < len(self.rows) and self.rows[origin] is not None
+
+    def get(self, origin, default=None):
+        """Return the row of `origin`, or `default` if it is unknown."""
+        if origin < len(self.rows) and self.rows[origin] is not None:
+            return self.rows[origin]
+        return default
+
+    def set(self, origin, row):
+        """Set the row of `origin`. Return whether it changed."""
+        rows = self.rows
+        if origin >= len(rows):
+            rows.extend([None] * (origin + 1 - len(rows)))
+        if rows[origin] == row:
+            return False
+        rows[origin] = row
+        return True
+
+    def neighbors(self, origin):
+        """Iterate over (neighbor id, cost) pairs advertised by `origin`."""
+        row = self.get(origin, EMPTY_ROW)
+        return zip(row[0], row[1])
+
+    def cost(self, origin, neighbor):
+        """Return the cost of the link from `origin` to `neighbor`, which must exist."""
+        ids, costs = self.rows[origin]
+        return costs[bisect_left(ids, neighbor)]
+
+    def origins(self):
+        """Iterate over the ids of routers with a known row."""
+        return (origin for origin, row in enumerate(self.rows) if row is not None)
+
+    def copy(self):
+        """Return a copy that shares the (immutable) rows."""
+        return LinkStateDB(list(self.rows))
+
+    def __len__(self):
+        return sum(1 for row in self.rows if row is not None)
@@ -0,0 +1,70 @@
+import struct
+
+# Header: origin address id, sequence number, number of entries. Each entry is a
+# neighbor (or destination) address id and a cost. Ids come from the
+# address table of the network (see lsdb.AddressTable).
+HEADER = struct.Struct("<IIH")
+ENTRY = struct.Struct("<Id")
+
+
+def encode(origin, seq, links):
+    """Encode a link-state packet (or a distance vector) as a packet content string.
+
+    `links` is a dict {address id: cost}. The binary encoding is wrapped in a latin-1
+    string, since packet content must be a string.
+    """
+    data = bytearray(HEADER.size + ENTRY.size * len(links))
+    HEADER.pack_into(data, 0, origin, seq, len(links))
+    offset = HEADER.size
+    for addr_id, cost in links.items():
+        ENTRY.pack_into(data, offset, addr_id, cost)
+        offset += ENTRY.size
+    return data.decode("latin-1")
+
+
+def peek(content):
+    """Return (origin, seq) of an encoded packet without decoding its entries."""
+    origin, seq, _ = HEADER.unpack_from(content[: HEADER.size].encode("latin-1"))
+    return origin, seq
+
+
+def decode(content):
+    """Decode a packet content string into (origin, seq, {address id: cost})."""
+    data = content.encode("latin-1")
+    origin, seq, count = HEADER.unpack_from(data)
+    end = HEADER.size + ENTRY.size * count
+    links = dict(ENTRY.iter_unpack(data[HEADER.size : end]))
+    return origin, seq, links
+
+
+class DecodeCache:
+    """
+    The DecodeCache class remembers decoded packets by (origin, seq), so that a packet
+    flooded to many routers, or received by a router on several ports, is only parsed
+    once. The content is checked as well, so packets from another network that reuse
+    the same (origin, seq) are never confused.
+
+    Parameters
+    ----------
+    max_size
+        The cache is emptied when it holds this many packets.
+    """
+
+    def __init__(self, max_size=1 << 14):
+        self.entries = {}
+        self.max_size = max_size
+
+    def decode(self, content):
+        """Same as `decode`, but the returned dict must not be modified."""
+        key = peek(content)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == content:
+            return entry[1]
+        decoded = decode(content)
+        if len(self.entries) >= self.max_size:
+            self.entries.clear()
+        self.entries[key] = (content, decoded)
+        return decoded
+
+
+DECODE_CACHE = DecodeCache()
@@ -0,0 +1,43 @@
+from packet import Packet
+
+
+class PacketCounter:
+    """
+    The PacketCounter class counts packets and bytes of content, separately for
+    routing and traceroute packets. The size of a packet is the length of its content
+    string (traceroute packets usually have no content).
+    """
+
+    __slots__ = ("routing_packets", "routing_bytes", "traceroute_packets",
+                 "traceroute_bytes")
+
+    def __init__(self):
+        self.routing_packets = 0
+        self.routing_bytes = 0
+        self.traceroute_packets = 0
+        self.traceroute_bytes = 0
+
+    def count(self, packet):
+        """Count one packet."""
+        size = len(packet.content) if packet.content else 0
+        if packet.kind == Packet.TRACEROUTE:
+            self.traceroute_packets += 1
+            self.traceroute_bytes += size
+        else:
+            self.routing_packets += 1
+            self.routing_bytes += size
+
+    @property
+    def packets(self):
+        """The number of packets of both kinds."""
+        return self.routing_packets + self.traceroute_packets
+
+    def add(self, other):
+        """Add the counts of `other` to this counter."""
+        self.routing_packets += other.routing_packets
+        self.routing_bytes += other.routing_bytes
+        self.traceroute_packets += other.traceroute_packets
+        self.traceroute_bytes += other.traceroute_bytes
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in PacketCounter.__slots__}
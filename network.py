@@ -1,15 +1,28 @@
 import argparse
+import asyncio
 import sys
 import threading
 import json
+import os
 import pickle
 import signal
 import time
-import queue
-from collections import defaultdict
+from changes import (
+    ChangeSchedule,
+    link_costs,
+    link_flaps,
+    router_failures,
+    sorted_changes,
+)
 from client import Client
+from eventtrace import TraceReplay, TraceWriter, read_changes, read_header
 from link import Link
+from lsdb import AddressTable
+from metrics import PacketCounter
+from packettrace import PacketRecorder
 from router import Router
+from scenario import CorrectRoutes, load_scenario
+from scheduler import AsyncioScheduler, EventQueue, EventTrigger, TimerThread
 
 
 def json_load_byteified(file_handle):
@@ -40,56 +53,274 @@ class Network:
     Parameters
     ----------
     net_json_path
-        The path to the JSON file that contains the network configurations.
+        The path to the JSON file that contains the network configurations, or to a
+        JSON Lines file if it ends with ".jsonl" (see `scenario.load_jsonl`).
     RouterClass
-        Whether to use DVrouter, LSrouter, or the default router.
+        Whether to use DVrouter, LSrouter, OracleRouter, or the default router.
     visualize
         Whether to visualize the network.
+    backend
+        "threads" to run every client and router in its own thread in real time,
+        "asyncio" to run them as coroutines on a single event loop in real time, or
+        "virtual" to drive them from a single event queue in virtual time. In all
+        cases, all links deliver packets through a single scheduler.
+    stop_when_converged
+        Whether to stop the simulation before the end time once all changes have been
+        applied and the network has converged (see `check_convergence`).
+    stability_window
+        How long (in the time unit of the JSON file) routes must stay correct for the
+        network to be considered converged. Defaults to 3 times the time it takes
+        clients to probe every destination.
+    report_path
+        If provided, write a JSON report of the run to this path at the end of `run`
+        (see `get_report`).
+    probe_fanout
+        If provided, clients only send traceroute packets to this many destinations
+        per send interval, in turn (see `Client`). The final batch still probes every
+        pair of clients.
+    changes
+        Optional additional sources of changes (lists, iterators or generators of
+        changes in time order, see `changes.py`), merged with the changes of the JSON
+        file. More can be added with `self.changes.add` before running. The costs of
+        sources given as lists count towards `infinity` (see `apply_change`).
+    jitter
+        If provided, every packet is delayed by a random extra time between 0 and
+        `jitter` (in the time unit of the JSON file), see `Link`.
+    jitter_seed
+        The seed of the random jitter, so that runs are reproducible.
+    trace_path
+        If provided, write the events of the run to this trace file (see
+        `eventtrace.py`). Needs the virtual backend.
+    replay_path
+        If provided, replay the trace file at this path: run with the jitter, probe
+        fanout, convergence settings and changes of the trace (ignoring `changes` and
+        the changes of the JSON file), compare the events of the run with those of the
+        trace and print where they differ. Needs the virtual backend.
+    packet_trace_path
+        If provided, record every packet sent and received on every link and every
+        change to this binary packet trace (see `packettrace.py`).
     """
 
-    def __init__(self, net_json_path, RouterClass, visualize=False):
+    def __init__(
+        self,
+        net_json_path,
+        RouterClass,
+        visualize=False,
+        backend="threads",
+        stop_when_converged=False,
+        stability_window=None,
+        report_path=None,
+        probe_fanout=None,
+        changes=(),
+        jitter=0,
+        jitter_seed=0,
+        trace_path=None,
+        replay_path=None,
+        packet_trace_path=None,
+    ):
+        if (trace_path or replay_path) and backend != "virtual":
+            raise ValueError("traces need the virtual backend")
+        if replay_path:
+            header = read_header(replay_path)
+            if os.path.abspath(header["scenario"]) != os.path.abspath(net_json_path):
+                sys.stderr.write(
+                    f"warning: replaying a trace of {header['scenario']} with "
+                    f"{net_json_path}\n"
+                )
+            jitter = header["jitter"]
+            jitter_seed = header["jitter_seed"]
+            probe_fanout = header["probe_fanout"]
+            # Traces written before these settings were recorded use the arguments
+            stop_when_converged = header.get("stop_when_converged", stop_when_converged)
+            stability_window = header.get("stability_window", stability_window)
+        self.jitter = jitter
+        self.jitter_seed = jitter_seed
+
         # Parse configuration details
-        with open(net_json_path, "r") as f:
-            net_json = json.load(f)
+        net_json = load_scenario(net_json_path)
         self.latency_multiplier = 100
         self.end_time = net_json["end_time"] * self.latency_multiplier
         self.visualize = visualize
         if visualize:
             self.latency_multiplier *= net_json["visualize"]["time_multiplier"]
         self.client_send_rate = net_json["client_send_rate"] * self.latency_multiplier
+        self.probe_fanout = probe_fanout
+        if stability_window is None:
+            num_clients = max(1, len(net_json["clients"]))
+            fanout = min(probe_fanout or num_clients, num_clients)
+            probe_rounds = -(-num_clients // fanout)  # Send intervals to probe all
+            stability_window = 3 * probe_rounds * net_json["client_send_rate"]
+        self.stability_window = stability_window * self.latency_multiplier
+        self.stop_when_converged = stop_when_converged
+        self.report_path = report_path
+        self.backend = backend
+        if backend == "virtual":
+            self.scheduler = EventQueue()
+        elif backend == "asyncio":
+            self.scheduler = AsyncioScheduler()
+        else:
+            self.scheduler = TimerThread()
+
+        # Address ids of this network, for the routers, the oracle and the packet trace.
+        # All addresses are interned in sorted order so that ids are the same in every
+        # process running this network.
+        self.addresses = AddressTable()
+        for addr in sorted(net_json["routers"] + net_json["clients"]):
+            self.addresses.intern(addr)
+        self.packet_recorder = None
+        if packet_trace_path:
+            self.packet_recorder = PacketRecorder(
+                packet_trace_path, self.scheduler.now, self.addresses
+            )
+
+        # Shortest routes to the clients over the links that are up, for OracleRouter
+        self.oracle = None
+        if "oracle" in RouterClass.network_args:
+            from oracle import TopologyOracle
+
+            self.oracle = TopologyOracle(
+                net_json["routers"], net_json["clients"], self.addresses
+            )
+
+        # Parse link changes
+        json_changes = self.parse_changes(net_json.get("changes", []))
+        # Links and routers changed by the JSON file, which random churn should leave
+        # alone, and the largest link cost, found in one pass since changes may be read
+        # lazily from the file. The pass also checks the order, so that a bad file
+        # fails before running.
+        self.scripted_links = set()
+        self.scripted_routers = set()
+        max_cost = max((max(link[4:6]) for link in net_json["links"]), default=1)
+        last_time = 0
+        for change_time, target, change in json_changes:
+            if change_time < last_time:
+                raise ValueError(
+                    f"change {[change_time, target, change]} of {net_json_path} is "
+                    "earlier than the previous one"
+                )
+            last_time = change_time
+            if change in ("crash", "restart"):
+                self.scripted_routers.add(target)
+                continue
+            self.scripted_links.add(tuple(target[:2]))
+            max_cost = max([max_cost, *link_costs(target, change)])
+        if replay_path:
+            json_changes, changes = [], [read_changes(replay_path)]
+            max_cost = header.get("max_cost", max_cost)
+        else:
+            # Other sources given as lists are known now too. The costs of lazy sources
+            # (generators, random churn) are checked when they are applied.
+            for source in changes:
+                if isinstance(source, (list, tuple)):
+                    for _, target, change in source:
+                        max_cost = max([max_cost, *link_costs(target, change)])
+        # Distance at which DVrouter considers a destination unreachable: more than the
+        # cost of any route that takes at most one link per router
+        self.max_cost = max_cost
+        self.infinity = len(net_json["routers"]) * max_cost + 1
 
         # Parse and create routers, clients, and links
+        self.all_links = []  # All links ever created, including those now down
+        self.RouterClass = RouterClass
         self.routers = self.parse_routers(net_json["routers"], RouterClass)
         self.clients = self.parse_clients(net_json["clients"], self.client_send_rate)
         self.links = self.parse_links(net_json["links"])
+        if self.oracle is not None:
+            self.oracle.invalidate(self.link_snapshot())
 
-        # Parse link changes
-        if "changes" in net_json:
-            self.changes = self.parse_changes(net_json["changes"])
-        else:
-            self.changes = None
+        self.changes = ChangeSchedule([json_changes])
+        for source in changes:
+            self.changes.add(source)
+        self.handle_changes_thread = None
+        self.stopped = threading.Event()  # Set to stop handling changes
+        # Links of every crashed router that come back up when it restarts, as dicts
+        # mapping link keys to links in the JSON format
+        self.crashed = {}
+        self.tasks = []  # Coroutines of clients and routers with the asyncio backend
+
+        # Trace of the run, or trace being replayed
+        self.trace = None
+        if trace_path:
+            header = {
+                "scenario": net_json_path,
+                "router": RouterClass.__name__,
+                "jitter": jitter,
+                "jitter_seed": jitter_seed,
+                "probe_fanout": probe_fanout,
+                "stop_when_converged": stop_when_converged,
+                "stability_window": stability_window,
+                "max_cost": self.max_cost,
+            }
+            self.trace = TraceWriter(trace_path, header)
+        elif replay_path:
+            self.trace = TraceReplay(replay_path)
 
         # Parse correct routes and create some tracking fields
         self.correct_routes = self.parse_correct_routes(net_json["correct_routes"])
         self.threads = []
-        self.routes = {}
-        self.routes_lock = threading.Lock()
+        # Routes found by traceroute packets are written without locking: every client
+        # has its own slots, only written from its own thread, and `routes` merges
+        # them. `arrived_routes[dst][src]` is the latest (route, is_good, time) of a
+        # traceroute from `src` that arrived at `dst`. `sent_routes[src][dst]` is the
+        # time of the latest traceroute sent from `src` to `dst`.
+        self.client_addrs = list(net_json["clients"])
+        self.reset_routes()
+        # Traceroutes that arrived since the convergence state below was last updated,
+        # as (src, route, is_good, sent time) by destination client. Like the routes,
+        # each list is only appended to from the thread of its client, without locking.
+        self.arrivals = {addr: [] for addr in self.client_addrs}
+        # Guards the convergence state below (change log and route history), which is
+        # updated from the arrivals when changes are applied and convergence is checked
+        self.convergence_lock = threading.Lock()
+
+        # Convergence tracking, see `check_convergence`. Times are in ms of `time_ms`.
+        self.start_time = 0
+        self.change_log = [
+            {
+                "time": 0,
+                "change": "start",
+                "target": None,
+                "converged_time": None,
+                "first_correct": {},
+            }
+        ]
+        # (route, is_good, time since the route is unchanged, latest time) by pair of
+        # clients, with the send times of the traceroutes that arrived
+        self.route_history = {}
 
     def parse_routers(self, router_params, RouterClass):
         """Parse routes from the `router_params` dict."""
         routers = {}
         for addr in router_params:
-            routers[addr] = RouterClass(
-                addr, heartbeat_time=self.latency_multiplier * 10
-            )
+            routers[addr] = self.create_router(addr, RouterClass)
         return routers
 
+    def create_router(self, addr, RouterClass):
+        """Create a router with no links.
+
+        The router also gets the attributes of the network named in its
+        `network_args`, such as the address table or the oracle.
+        """
+        kwargs = {name: getattr(self, name) for name in RouterClass.network_args}
+        return RouterClass(addr, heartbeat_time=self.latency_multiplier * 10, **kwargs)
+
+    def is_local(self, addr):
+        """Return whether the router or client `addr` is simulated by this network
+        (see `ShardNetwork`).
+        """
+        return True
+
     def parse_clients(self, client_params, client_send_rate):
         """Parse clients from `client_params` dict."""
         clients = {}
         for addr in client_params:
             clients[addr] = Client(
-                addr, client_params, client_send_rate, self.update_route
+                addr,
+                client_params,
+                client_send_rate,
+                self.update_route,
+                sent_fn=self.update_routes_sent,
+                probe_fanout=self.probe_fanout,
             )
         return clients
 
@@ -97,24 +328,41 @@ class Network:
         """Parse links from the `link_params` dict."""
         links = {}
         for addr1, addr2, p1, p2, c12, c21 in link_params:
-            link = Link(addr1, addr2, c12, c21, self.latency_multiplier)
+            link = self.create_link(addr1, addr2, c12, c21)
             links[(addr1, addr2)] = (p1, p2, c12, c21, link)
+            self.all_links.append(link)
         return links
 
+    def create_link(self, addr1, addr2, c12, c21):
+        """Create a link that delivers packets with the network's scheduler."""
+        link = Link(
+            addr1,
+            addr2,
+            c12,
+            c21,
+            self.latency_multiplier,
+            scheduler=self.scheduler,
+            jitter=self.jitter,
+            seed=self.jitter_seed,
+        )
+        if self.packet_recorder is not None:
+            self.packet_recorder.add_link(link)
+        return link
+
     def parse_changes(self, changes_params):
-        """Parse link changes from the `changes_params` dict."""
-        changes = queue.PriorityQueue()
-        for change in changes_params:
-            changes.put(change)
-        return changes
+        """Parse changes from `changes_params`: a list, returned sorted by time, or an
+        iterable of changes in time order (e.g. the changes of a JSON Lines file, see
+        `scenario.JsonlChanges`), which is returned as is to be read lazily.
+        """
+        if isinstance(changes_params, list):
+            return sorted_changes(changes_params)
+        return changes_params
 
     def parse_correct_routes(self, routes_params):
-        """Parse correct routes from the `routes_params` dict/"""
-        correct_routes = defaultdict(list)
-        for route in routes_params:
-            src, dst = route[0], route[-1]
-            correct_routes[(src, dst)].append(route)
-        return correct_routes
+        """Parse correct routes from the `routes_params` list (or `CorrectRoutes`)."""
+        if isinstance(routes_params, CorrectRoutes):
+            return routes_params
+        return CorrectRoutes(routes_params)
 
     def run(self):
         """Run the network.
@@ -122,25 +370,222 @@ class Network:
         Start threads for each client and router. Start thread to track link changes.
         If not visualizing, wait until end time and print the final routes.
         """
-        for router in self.routers.values():
-            thread = RouterThread(router)
-            thread.start()
-            self.threads.append(thread)
-        for client in self.clients.values():
-            thread = ClientThread(client)
-            thread.start()
-            self.threads.append(thread)
+        if self.backend == "virtual":
+            self.run_virtual()
+            return
+        if self.backend == "asyncio":
+            asyncio.run(self.run_async())
+            return
+        self.scheduler.start()
+        self.start_time = self.change_log[0]["time"] = self.time_ms()
+        for node in list(self.routers.values()) + list(self.clients.values()):
+            self.start_node(node)
         self.add_links()
-        if self.changes:
+        if not self.changes.exhausted:
             self.handle_changes_thread = HandleChangesThread(self)
             self.handle_changes_thread.start()
 
         if not self.visualize:
             signal.signal(signal.SIGINT, self.handle_interrupt)
-            time.sleep(self.end_time / 1000)
+            self.sleep(self.end_time, self.check_convergence, self.stop_when_converged)
             self.final_routes()
-            sys.stdout.write("\n" + self.get_route_string() + "\n")
+            self.print_results()
             self.join_all()
+            self.finish_traces()
+
+    def run_virtual(self):
+        """Run the network in virtual time.
+
+        Clients, routers and link changes are driven by the event queue instead of
+        threads, so the simulation finishes as fast as possible. Print the final routes.
+        """
+        self.start_virtual()
+        self.run_virtual_for(
+            self.end_time, self.check_convergence, self.stop_when_converged
+        )
+        self.reset_routes()
+        for client in self.clients.values():
+            client.last_send()
+        self.run_virtual_for(*self.final_wait())
+        self.print_results()
+        self.finish_traces()
+
+    def run_virtual_for(self, duration_ms, done, stop_early):
+        """Advance virtual time by `duration_ms`, checking `done()` once per client
+        send period. Stop early when `done()` returns True if `stop_early`.
+        """
+        clock = self.scheduler
+        end_time = clock.now() + duration_ms
+        while clock.now() < end_time:
+            clock.run_until(min(end_time, clock.now() + self.client_send_rate))
+            if done() and stop_early:
+                return
+
+    def start_virtual(self):
+        """Add links and schedule main loops and link changes on the event queue."""
+        for node in list(self.routers.values()) + list(self.clients.values()):
+            self.start_node(node)
+        self.add_links()
+        self.schedule_next_change()
+
+    def start_node(self, node):
+        """Run the main loop of a client or router with the network's backend."""
+        if self.backend == "virtual":
+            node.wakeup = EventTrigger(self.scheduler, self.step_virtual, node)
+            self.scheduler.call_later(node.tick_interval, self.tick_virtual, node)
+        elif self.backend == "asyncio":
+            node.wakeup = asyncio.Event()
+            self.tasks.append(asyncio.create_task(node.run_async()))
+        else:
+            if isinstance(node, Router):
+                thread = RouterThread(node)
+            else:
+                thread = ClientThread(node)
+            thread.start()
+            self.threads.append(thread)
+
+    def add_link_flaps(self, mtbf, mttr=None, seed=0):
+        """Make links between routers fail and get repaired at random during the first
+        half of the simulation (see `changes.link_flaps`), except links changed by the
+        JSON file, so that the final network is unchanged. Times are in the time unit
+        of the JSON file, and `mttr` defaults to a tenth of `mtbf`.
+        """
+        router_links = [
+            [addr1, addr2, p1, p2, c12, c21]
+            for (addr1, addr2), (p1, p2, c12, c21, _) in self.links.items()
+            if addr1 in self.routers
+            and addr2 in self.routers
+            and (addr1, addr2) not in self.scripted_links
+        ]
+        self.changes.add(
+            link_flaps(
+                router_links,
+                mtbf,
+                mttr or mtbf / 10,
+                seed=seed,
+                until=self.end_time / self.latency_multiplier / 2,
+            )
+        )
+
+    def add_router_crashes(self, mtbf, mttr=None, seed=0):
+        """Make routers crash and restart at random during the first half of the
+        simulation (see `changes.router_failures`), except routers crashed by the JSON
+        file. Times are in the time unit of the JSON file, and `mttr` defaults to a
+        tenth of `mtbf`.
+        """
+        routers = sorted(
+            addr for addr in self.routers if addr not in self.scripted_routers
+        )
+        self.changes.add(
+            router_failures(
+                routers,
+                mtbf,
+                mttr or mtbf / 10,
+                seed=seed,
+                until=self.end_time / self.latency_multiplier / 2,
+            )
+        )
+
+    def schedule_next_change(self):
+        """Schedule the next change on the event queue, see `apply_next_change`."""
+        change = self.changes.peek()
+        if change is not None:
+            self.scheduler.call_at(
+                change[0] * self.latency_multiplier, self.apply_next_change
+            )
+
+    def apply_next_change(self):
+        """Apply the next change and schedule the one after it, so that changes are
+        taken from the schedule lazily.
+        """
+        next_change = self.changes.pop()
+        if self.trace is not None:
+            self.trace.record(["change", self.scheduler.now(), next_change])
+        _, target, change = next_change
+        self.apply_change(change, target)
+        self.schedule_next_change()
+
+    async def run_async(self):
+        """Run the network on an asyncio event loop.
+
+        Run a coroutine for each client and router, and one to track link changes.
+        Wait until end time and print the final routes.
+        """
+        self.scheduler.loop = asyncio.get_running_loop()
+        self.start_time = self.change_log[0]["time"] = self.time_ms()
+        for node in list(self.routers.values()) + list(self.clients.values()):
+            self.start_node(node)
+        self.add_links()
+        changes_task = asyncio.create_task(self.handle_changes_async())
+        await self.sleep_async(
+            self.end_time, self.check_convergence, self.stop_when_converged
+        )
+        self.reset_routes()
+        for client in self.clients.values():
+            client.last_send()
+        await self.sleep_async(*self.final_wait())
+        self.print_results()
+        for node in list(self.routers.values()) + list(self.clients.values()):
+            node.keep_running = False
+        changes_task.cancel()  # Changes may be endless
+        await asyncio.gather(*self.tasks, changes_task, return_exceptions=True)
+        self.finish_traces()
+
+    async def sleep_async(self, duration_ms, done, stop_early):
+        """Coroutine version of `sleep`."""
+        end_time = time.time() * 1000 + duration_ms
+        while True:
+            remaining = end_time - time.time() * 1000
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, self.client_send_rate) / 1000)
+            if done() and stop_early:
+                return
+
+    async def handle_changes_async(self):
+        """Handle changes to links, as a coroutine. See `handle_changes`."""
+        start_time = time.time() * 1000
+        while not self.changes.exhausted:
+            change_time, target, change = self.changes.pop()
+            current_time = time.time() * 1000
+            wait_time = (
+                change_time * self.latency_multiplier + start_time
+            ) - current_time
+            if wait_time > 0:
+                await asyncio.sleep(wait_time / 1000)
+            self.apply_change(change, target)
+
+    def step_virtual(self, node):
+        """Run one iteration of a client's or router's main loop in virtual time."""
+        if not node.keep_running:
+            return
+        if self.trace is None or not isinstance(node, Router):
+            node.tick(self.scheduler.now())
+            return
+        # Record the work done in this iteration, if any
+        before = (node.received.packets, node.sent.packets, node.route_computations)
+        node.tick(self.scheduler.now())
+        work = [
+            node.received.packets - before[0],
+            node.sent.packets - before[1],
+            node.route_computations - before[2],
+        ]
+        if any(work):
+            self.trace.record(["tick", self.scheduler.now(), node.addr] + work)
+
+    def tick_virtual(self, node):
+        """Periodically run the main loop of a client or router in virtual time, until
+        it is stopped (when a router crashes).
+        """
+        if node.keep_running:
+            self.step_virtual(node)
+            self.scheduler.call_later(node.tick_interval, self.tick_virtual, node)
+
+    def time_ms(self):
+        """Return the current simulation time in ms."""
+        if self.backend == "virtual":
+            return self.scheduler.now()
+        return int(round(time.time() * 1000))
 
     def add_links(self):
         """Add links to clients and routers."""
@@ -158,101 +603,526 @@ class Network:
     def handle_changes(self):
         """Handle changes to links.
 
-        Run this method in a separate thread. Use a priority queue to track the time of
-        next change.
+        Run this method in a separate thread. Take changes from the schedule in time
+        order and sleep until each is due, until `stopped` is set.
         """
         start_time = time.time() * 1000
-        while not self.changes.empty():
-            change_time, target, change = self.changes.get()
+        while not self.changes.exhausted:
+            change_time, target, change = self.changes.pop()
             current_time = time.time() * 1000
             wait_time = (
                 change_time * self.latency_multiplier + start_time
             ) - current_time
-            if wait_time > 0:
-                time.sleep(wait_time / 1000)
+            if wait_time > 0 and self.stopped.wait(wait_time / 1000):
+                return
+            self.apply_change(change, target)
+
+    def apply_change(self, change, target):
+        """Apply a single change ("up", "down", "cost", "crash" or "restart", see
+        `changes.py`).
+
+        Taking down a link that is not up, or changing its costs, does nothing, and so
+        does crashing a crashed router or restarting a router that did not crash.
 
-            # Link changes
+        Raise ValueError if routers use `infinity` and the change sets a link cost
+        larger than the one it was derived from.
+        """
+        if "infinity" in self.RouterClass.network_args:
+            cost = max(link_costs(target, change), default=0)
+            if cost > self.max_cost:
+                raise ValueError(
+                    f"change {[target, change]} sets a link cost of {cost}, larger "
+                    f"than {self.max_cost}, the largest cost infinity was derived "
+                    "from; give changes with larger costs as lists"
+                )
+        with self.convergence_lock:
+            self.merge_arrivals()
+            # Changes cut the stability window of the previous ones short. Correct
+            # routes are those of the final network, so only check that routes settled.
+            converged_time = self.find_convergence_time(0, correct=False)
+            if converged_time is not None:
+                self.set_convergence_time(converged_time)
+
+            if self.packet_recorder is not None:
+                self.record_change(change, target)
             if change == "up":
-                addr1, addr2, p1, p2, c12, c21 = target
-                link = Link(addr1, addr2, c12, c21, self.latency_multiplier)
-                self.links[(addr1, addr2)] = (p1, p2, c12, c21, link)
-                self.routers[addr1].change_link(("add", p1, addr2, link, c12))
-                self.routers[addr2].change_link(("add", p2, addr1, link, c21))
+                self.link_up(target)
             elif change == "down":
-                addr1, addr2 = target
-                p1, p2, _, _, link = self.links[(addr1, addr2)]
-                self.routers[addr1].change_link(("remove", p1))
-                self.routers[addr2].change_link(("remove", p2))
+                self.link_down(tuple(target))
+            elif change == "cost":
+                self.change_cost(target)
+            elif change == "crash" and target not in self.crashed:
+                self.crash_router(target)
+            elif change == "restart" and target in self.crashed:
+                self.restart_router(target)
+            if self.oracle is not None:
+                self.oracle.invalidate(self.link_snapshot())
+
+            # Routes to clients cut off by the change are gone, even if they come back
+            detached = self.detached_clients()
+            for pair in list(self.route_history):
+                if pair[0] in detached or pair[1] in detached:
+                    del self.route_history[pair]
+            self.change_log.append(
+                {
+                    "time": self.time_ms(),
+                    "change": change,
+                    "target": target,
+                    "converged_time": None,
+                    "first_correct": {},
+                }
+            )
+
+        # Update visualization
+        if hasattr(Network, "visualize_changes_callback"):
+            Network.visualize_changes_callback(change, target)
+
+    def link_snapshot(self):
+        """Return the links that are up, as [addr1, addr2, p1, p2, c12, c21] lists.
+
+        Changes are applied with `convergence_lock` held, so take the snapshot with it
+        held too (or before running).
+        """
+        return [
+            [addr1, addr2, p1, p2, c12, c21]
+            for (addr1, addr2), (p1, p2, c12, c21, _) in self.links.items()
+        ]
+
+    def record_change(self, change, target):
+        """Record a change in the packet trace, before it is applied."""
+        if change in ("crash", "restart"):
+            self.packet_recorder.record_change(change, target, None, None)
+            return
+        addr1, addr2 = target[:2]
+        entry = self.links.get((addr1, addr2))
+        link = entry[4] if entry is not None else None
+        self.packet_recorder.record_change(change, addr1, addr2, link)
+
+    def link_up(self, link_params):
+        """Add a link [addr1, addr2, p1, p2, c12, c21] and notify its endpoints.
 
-            # Update visualization
-            if hasattr(Network, "visualize_changes_callback"):
-                Network.visualize_changes_callback(change, target)
+        A link to a crashed router only comes up when the router restarts.
+        """
+        addr1, addr2, p1, p2, c12, c21 = link_params
+        for addr in (addr1, addr2):
+            if addr in self.crashed:
+                self.crashed[addr][(addr1, addr2)] = list(link_params)
+                return
+        link = self.create_link(addr1, addr2, c12, c21)
+        self.links[(addr1, addr2)] = (p1, p2, c12, c21, link)
+        self.all_links.append(link)
+        for addr in (addr1, addr2):
+            if addr in self.clients:
+                self.clients[addr].change_link(("add", link))
+        if addr1 in self.routers:
+            self.routers[addr1].change_link(("add", p1, addr2, link, c12))
+        if addr2 in self.routers:
+            self.routers[addr2].change_link(("add", p2, addr1, link, c21))
+
+    def link_down(self, key):
+        """Remove the link (addr1, addr2) and notify the routers at its endpoints."""
+        if key not in self.links:
+            # A link of a crashed router no longer comes up when it restarts
+            for saved_links in self.crashed.values():
+                saved_links.pop(key, None)
+            return
+        addr1, addr2 = key
+        p1, p2, _, _, link = self.links.pop(key)
+        if addr1 in self.routers:
+            self.routers[addr1].change_link(("remove", p1))
+        if addr2 in self.routers:
+            self.routers[addr2].change_link(("remove", p2))
+
+    def change_cost(self, cost_params):
+        """Change the costs of a link to [addr1, addr2, c12, c21]."""
+        addr1, addr2, c12, c21 = cost_params
+        key = (addr1, addr2)
+        if key not in self.links:
+            for saved_links in self.crashed.values():
+                if key in saved_links:
+                    saved_links[key][4:] = [c12, c21]
+            return
+        # Routers see the link removed and added back with the new costs
+        p1, p2, _, _, link = self.links[key]
+        link.change_latency(addr1, c12)
+        link.change_latency(addr2, c21)
+        self.links[key] = (p1, p2, c12, c21, link)
+        if addr1 in self.routers:
+            self.routers[addr1].change_link(("add", p1, addr2, link, c12))
+        if addr2 in self.routers:
+            self.routers[addr2].change_link(("add", p2, addr1, link, c21))
+
+    def crash_router(self, addr):
+        """Stop the router `addr` and take all its links down.
+
+        Its neighbors see their links to it removed. The links are saved to come back up
+        when the router restarts.
+        """
+        router = self.routers.get(addr)
+        if router is not None:
+            router.keep_running = False
+            router.notify()
+        saved_links = {}
+        for key in [key for key in self.links if addr in key]:
+            p1, p2, c12, c21, _ = self.links[key]
+            saved_links[key] = [key[0], key[1], p1, p2, c12, c21]
+            self.link_down(key)
+        self.crashed[addr] = saved_links
 
-    def update_route(self, src, dst, route):
+    def restart_router(self, addr):
+        """Replace the crashed router `addr` with a new instance of the router class,
+        which has lost all routing state, and bring its saved links back up.
+
+        Links to routers that are still crashed come up when those restart.
+        """
+        saved_links = self.crashed.pop(addr)
+        if self.is_local(addr):
+            router = self.create_router(addr, self.RouterClass)
+            crashed_router = self.routers.get(addr)
+            if crashed_router is not None:
+                # Statistics are kept across restarts
+                router.sent.add(crashed_router.sent)
+                router.received.add(crashed_router.received)
+                router.route_computations += crashed_router.route_computations
+            self.routers[addr] = router
+            self.start_node(router)
+        for link_params in saved_links.values():
+            self.link_up(link_params)
+
+    def update_route(self, src, dst, route, sent_time=None):
         """
         Callback function used by clients to update the current routes taken by
-        traceroute packets.
+        traceroute packets. `sent_time` is the time at which the traceroute was sent.
+
+        An empty route means a traceroute was just sent by `src`, and is called from
+        the thread of `src`. Otherwise the traceroute arrived and this is called from
+        the thread of `dst`. So each slot is only written by one thread.
         """
-        self.routes_lock.acquire()
-        time_ms = int(round(time.time() * 1000))
-        is_good = route in self.correct_routes[(src, dst)]
-        try:
-            _, _, current_time = self.routes[(src, dst)]
-            if time_ms > current_time:
-                self.routes[(src, dst)] = (route, is_good, time_ms)
-        except KeyError:
-            self.routes[(src, dst)] = (route, is_good, time_ms)
-        finally:
-            self.routes_lock.release()
+        time_ms = self.time_ms()
+        if not route:
+            self.sent_routes[src][dst] = time_ms
+            return
+        is_good = self.correct_routes.is_correct(route)
+        slots = self.arrived_routes[dst]
+        current = slots.get(src)
+        if current is None or time_ms > current[2]:
+            slots[src] = (route, is_good, time_ms)
+        if sent_time is not None:
+            self.arrivals[dst].append((src, route, is_good, sent_time))
+
+    def update_routes_sent(self, src, dsts):
+        """
+        Callback function used by clients to record that traceroute packets were just
+        sent from `src` to every address in `dsts`, as one update.
+        """
+        self.sent_routes[src].update(dict.fromkeys(dsts, self.time_ms()))
+
+    @property
+    def routes(self):
+        """A snapshot of the current routes, as a dict mapping (src, dst) pairs to
+        (route, is_good, time) tuples. The route is empty if the latest traceroute
+        sent has not arrived yet.
+        """
+        routes = {}
+        for dst, slots in list(self.arrived_routes.items()):
+            for src, entry in slots.copy().items():
+                routes[(src, dst)] = entry
+        for src, slots in list(self.sent_routes.items()):
+            for dst, time_ms in slots.copy().items():
+                entry = routes.get((src, dst))
+                if entry is None or time_ms > entry[2]:
+                    routes[(src, dst)] = ([], False, time_ms)
+        return routes
+
+    def merge_routes(self, routes):
+        """Merge a dict of routes in the format of `routes`, keeping the latest."""
+        for (src, dst), (route, is_good, time_ms) in routes.items():
+            if route:
+                current = self.arrived_routes[dst].get(src)
+                if current is None or time_ms > current[2]:
+                    self.arrived_routes[dst][src] = (route, is_good, time_ms)
+            else:
+                current = self.sent_routes[src].get(dst)
+                if current is None or time_ms > current:
+                    self.sent_routes[src][dst] = time_ms
+
+    def merge_arrivals(self):
+        """Update the convergence state with the traceroutes that arrived since the
+        last merge. `convergence_lock` must be held.
+
+        Clients keep appending to their lists meanwhile, so only the arrivals that were
+        there when the merge started are removed.
+        """
+        for dst, arrivals in self.arrivals.items():
+            count = len(arrivals)
+            for src, route, is_good, sent_time in arrivals[:count]:
+                self.track_convergence((src, dst), route, is_good, sent_time)
+            del arrivals[:count]
+
+    def track_convergence(self, pair, route, is_good, sent_time):
+        """Record the arrival of a traceroute sent at `sent_time` for `pair`.
+        `convergence_lock` must be held.
+        """
+        # Traceroutes sent before the latest change say nothing about convergence
+        if sent_time < self.change_log[-1]["time"]:
+            return
+        if is_good:
+            self.change_log[-1]["first_correct"].setdefault(pair, sent_time)
+        history = self.route_history.get(pair)
+        if history is None or history[0] != route:
+            self.route_history[pair] = (route, is_good, sent_time, sent_time)
+        elif sent_time > history[3]:
+            self.route_history[pair] = (route, is_good, history[2], sent_time)
+
+    def find_convergence_time(self, window, correct=True):
+        """Return the time at which routes converged after the latest change, or None.
+
+        The routes converged at time T (no earlier than the latest change) if, for
+        every pair of clients with correct routes, all traceroutes sent after T that
+        arrived took the same route (a correct one if `correct`), and one sent at least
+        `window` after T arrived. Pairs with a client that has no link up (e.g. to a
+        crashed router) are left out. `convergence_lock` must be held.
+        """
+        change_time = self.change_log[-1]["time"]
+        converged_time = change_time
+        detached = self.detached_clients()
+        pairs = [
+            pair
+            for pair in self.correct_routes
+            if pair[0] not in detached and pair[1] not in detached
+        ]
+        for pair in pairs:
+            history = self.route_history.get(pair)
+            if history is None or history[3] < change_time:
+                return None
+            if correct and not history[1]:
+                return None
+            converged_time = max(converged_time, history[2])
+        for pair in pairs:
+            if self.route_history[pair][3] < converged_time + window:
+                return None
+        return converged_time
+
+    def detached_clients(self):
+        """Return the set of clients that have no link up."""
+        attached = {addr for key in self.links for addr in key}
+        return {addr for addr in self.client_addrs if addr not in attached}
+
+    def set_convergence_time(self, converged_time):
+        """Record the convergence time of the latest change(s).
+
+        Earlier changes that had not converged when the next one was applied keep no
+        convergence time.
+        """
+        latest_time = self.change_log[-1]["time"]
+        for entry in reversed(self.change_log):
+            if entry["converged_time"] is not None or entry["time"] < latest_time:
+                break
+            entry["converged_time"] = converged_time
+
+    def check_convergence(self):
+        """Record convergence times and return whether the network has converged.
+
+        The network has converged once all changes have been applied and routes have
+        stayed correct for `stability_window` after the last one (see
+        `find_convergence_time`).
+        """
+        with self.convergence_lock:
+            self.merge_arrivals()
+            converged_time = self.find_convergence_time(self.stability_window)
+            if converged_time is None:
+                return False
+            self.set_convergence_time(converged_time)
+            num_applied = len(self.change_log) - 1
+            return self.changes.exhausted and num_applied >= self.changes.popped
+
+    def all_routes_received(self):
+        """Return whether a route has been received for every pair of clients."""
+        routes = self.routes
+        return len(routes) == len(self.clients) ** 2 and all(
+            route for route, _, _ in routes.values()
+        )
+
+    def get_convergence_string(self):
+        """
+        Create a string with the time of every change and the time it took for routes
+        to converge after it, relative to the start of the simulation.
+        """
+        lines = []
+        with self.convergence_lock:
+            self.merge_arrivals()
+            for i, entry in enumerate(self.change_log):
+                change_time = entry["time"] - self.start_time
+                if entry["converged_time"] is None and i + 1 < len(self.change_log):
+                    info = "did not converge before the next change"
+                elif entry["converged_time"] is None:
+                    info = "did not converge"
+                else:
+                    delay = entry["converged_time"] - entry["time"]
+                    info = f"converged after {delay:g} ms"
+                target = f" {entry['target']}" if entry["target"] else ""
+                lines.append(f"{change_time:g} ms {entry['change']}{target}: {info}")
+        return "\n".join(lines)
+
+    def get_report(self):
+        """Create a dict (JSON serializable) with statistics of the run.
+
+        It contains, relative to the start of the simulation and in ms: the time of
+        every change, how long routes took to converge after it and when each pair of
+        clients first sent a traceroute that took a correct route after it. It also
+        contains the routing and traceroute packets and bytes sent on every link (by
+        sending endpoint), sent and received by every router, and the number of route
+        computations of every router.
+        """
+        with self.convergence_lock:
+            self.merge_arrivals()
+            changes = []
+            for entry in self.change_log:
+                converged_time = entry["converged_time"]
+                changes.append(
+                    {
+                        "time_ms": entry["time"] - self.start_time,
+                        "change": entry["change"],
+                        "target": entry["target"],
+                        "convergence_ms": (
+                            None
+                            if converged_time is None
+                            else converged_time - entry["time"]
+                        ),
+                        "first_correct_ms": [
+                            [src, dst, sent_time - entry["time"]]
+                            for (src, dst), sent_time in sorted(
+                                entry["first_correct"].items()
+                            )
+                        ],
+                    }
+                )
+
+        links = []
+        link_totals = PacketCounter()
+        for link in self.all_links:
+            for counter in link.counters.values():
+                link_totals.add(counter)
+            links.append(
+                {
+                    "endpoints": [link.e1, link.e2],
+                    "sent": {
+                        addr: counter.to_dict()
+                        for addr, counter in link.counters.items()
+                    },
+                }
+            )
+        routers = {}
+        for addr, router in sorted(self.routers.items()):
+            routers[addr] = {
+                "sent": router.sent.to_dict(),
+                "received": router.received.to_dict(),
+                "route_computations": router.route_computations,
+            }
+        return {
+            "backend": self.backend,
+            "duration_ms": self.time_ms() - self.start_time,
+            "changes": changes,
+            "links": links,
+            "routers": routers,
+            "totals": dict(
+                link_totals.to_dict(),
+                route_computations=sum(
+                    router.route_computations for router in self.routers.values()
+                ),
+            ),
+        }
+
+    def print_results(self):
+        """Print the convergence times if stopping early, then the final routes.
+        Write the report if a report path was given.
+        """
+        if self.stop_when_converged:
+            sys.stdout.write("\n" + self.get_convergence_string() + "\n")
+        sys.stdout.write("\n" + self.get_route_string() + "\n")
+        if self.report_path:
+            with open(self.report_path, "w") as f:
+                json.dump(self.get_report(), f, indent=2)
 
     def get_route_string(self, label_incorrect=True):
         """
         Create a string with all the current routes found by traceroute packets and
         whether they are correct.
         """
-        self.routes_lock.acquire()
+        routes = self.routes
         route_strings = []
         all_correcct = True
-        for src, dst in self.routes:
-            route, is_good, _ = self.routes[(src, dst)]
+        for (src, dst), (route, is_good, _) in routes.items():
             info = "" if (is_good or not label_incorrect) else "Incorrect Route"
             route_strings.append(f"{src} -> {dst}: {route} {info}")
             if not is_good:
                 all_correcct = False
         route_strings.sort()
-        if all_correcct and len(self.routes) > 0:
+        if all_correcct and len(routes) > 0:
             route_strings.append("\nSUCCESS: All Routes correct!")
         else:
             route_strings.append("\nFAILURE: Not all routes are correct")
-        route_string = "\n".join(route_strings)
-        self.routes_lock.release()
-        return route_string
+        return "\n".join(route_strings)
 
     def get_route_pickle(self):
         """Create a pickle with the current routes found by traceroute packets."""
-        self.routes_lock.acquire()
-        route_pickle = pickle.dumps(self.routes)
-        self.routes_lock.release()
-        return route_pickle
+        return pickle.dumps(self.routes)
+
+    def finish_traces(self):
+        """Close the traces. When replaying, print how the run differs from the trace.
+        """
+        if self.packet_recorder is not None:
+            self.packet_recorder.close()
+        if self.trace is None:
+            return
+        self.trace.close()
+        if isinstance(self.trace, TraceReplay):
+            sys.stdout.write("\n" + self.trace.get_summary() + "\n")
 
     def reset_routes(self):
         """Reset the routes found by traceroute packets."""
-        self.routes_lock.acquire()
-        self.routes = {}
-        self.routes_lock.release()
+        self.arrived_routes = {addr: {} for addr in self.client_addrs}
+        self.sent_routes = {addr: {} for addr in self.client_addrs}
 
     def final_routes(self):
         """Have the clients send one final batch of traceroute packets."""
         self.reset_routes()
         for client in self.clients.values():
             client.last_send()
-        time.sleep(4 * self.client_send_rate / 1000)
+        self.sleep(*self.final_wait())
+
+    def final_wait(self):
+        """Return the arguments of `sleep` to wait for the final batch of traceroutes.
+
+        When stopping early or probing few destinations at a time (so that few older
+        traceroutes are still in flight), wait until all routes are received, for at
+        most the end time so that slow routes have time to arrive.
+        """
+        if self.stop_when_converged or self.probe_fanout is not None:
+            wait_time = max(4 * self.client_send_rate, self.end_time)
+            return wait_time, self.all_routes_received, True
+        return 4 * self.client_send_rate, self.all_routes_received, False
+
+    def sleep(self, duration_ms, done, stop_early):
+        """Sleep for `duration_ms`, checking `done()` once per client send period.
+        Stop early when `done()` returns True if `stop_early`.
+        """
+        end_time = time.time() * 1000 + duration_ms
+        while True:
+            remaining = end_time - time.time() * 1000
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, self.client_send_rate) / 1000)
+            if done() and stop_early:
+                return
 
     def join_all(self):
-        if self.changes:
+        self.stopped.set()
+        if self.handle_changes_thread is not None:
             self.handle_changes_thread.join()
         for thread in self.threads:
             thread.join()
+        self.scheduler.join()
 
     def handle_interrupt(self, signum, frame):
         self.join_all()
@@ -270,10 +1140,125 @@ def main():
     parser.add_argument(
         "router",
         type=str,
-        choices=["DV", "LS"],
+        choices=["DV", "LS", "Oracle"],
         nargs="?",
         default=None,
-        help="DV for DVrouter and LS for LSrouter. If not provided, Router is used.",
+        help="DV for DVrouter, LS for LSrouter and Oracle for OracleRouter. If not "
+        "provided, Router is used.",
+    )
+    parser.add_argument(
+        "--ecmp",
+        action="store_true",
+        help="With LS, forward over every equal-cost shortest route, choosing one per "
+        "(src, dst) flow.",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=["threads", "asyncio", "virtual"],
+        default="threads",
+        help="Run clients and routers in real-time threads (default), as coroutines "
+        "on one asyncio event loop, or in virtual time driven by a single event queue.",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split routers into this many shards simulated by separate processes in "
+        "virtual time (implies --backend virtual).",
+    )
+    parser.add_argument(
+        "--stop-when-converged",
+        action="store_true",
+        help="Stop before the end time once routes have converged after the last "
+        "change, and print the convergence time of every change.",
+    )
+    parser.add_argument(
+        "--stability-window",
+        type=float,
+        default=None,
+        help="How long routes must stay correct to be considered converged, in the "
+        "time unit of the JSON file (default: 3 times the time clients take to "
+        "probe every destination).",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Write a JSON report with convergence times, packet and byte counts per "
+        "link and router, and route computations to this path.",
+    )
+    parser.add_argument(
+        "--probe-fanout",
+        type=int,
+        default=None,
+        help="Number of destinations each client sends traceroute packets to per "
+        "send interval, in turn (default: all clients).",
+    )
+    parser.add_argument(
+        "--flap-mtbf",
+        type=float,
+        default=None,
+        help="Make links between routers fail at random during the first half of the "
+        "simulation, with this mean time between failures (in the time unit of the "
+        "JSON file).",
+    )
+    parser.add_argument(
+        "--flap-mttr",
+        type=float,
+        default=None,
+        help="Mean time to repair of failed links (default: a tenth of the MTBF).",
+    )
+    parser.add_argument(
+        "--crash-mtbf",
+        type=float,
+        default=None,
+        help="Make routers crash and restart with no routing state at random during "
+        "the first half of the simulation, with this mean time between failures (in "
+        "the time unit of the JSON file).",
+    )
+    parser.add_argument(
+        "--crash-mttr",
+        type=float,
+        default=None,
+        help="Mean time to restart of crashed routers (default: a tenth of the MTBF).",
+    )
+    parser.add_argument(
+        "--churn-seed",
+        type=int,
+        default=0,
+        help="Seed of the random link failures and router crashes.",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0,
+        help="Delay every packet by a random extra time up to this value (in the time "
+        "unit of the JSON file).",
+    )
+    parser.add_argument(
+        "--jitter-seed", type=int, default=0, help="Seed of the random jitter."
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="Write every change and the work of every router main loop iteration to "
+        "this trace file (implies --backend virtual).",
+    )
+    parser.add_argument(
+        "--packet-trace",
+        type=str,
+        default=None,
+        help="Record every packet sent and received on every link, and every change, "
+        "to this binary packet trace file.",
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        default=None,
+        help="Run with the settings and changes of this trace file (implies --backend "
+        "virtual) and print the first event and the router work that differ from it.",
     )
     args = parser.parse_args()
 
@@ -283,11 +1268,77 @@ def main():
 
         RouterClass = DVrouter
     elif args.router == "LS":
-        from LSrouter import LSrouter
+        from LSrouter import ECMProuter, LSrouter
+
+        RouterClass = ECMProuter if args.ecmp else LSrouter
+    elif args.router == "Oracle":
+        from oracle import OracleRouter
 
-        RouterClass = LSrouter
+        RouterClass = OracleRouter
+    if args.ecmp and args.router != "LS":
+        parser.error("--ecmp needs the LS router")
+    if args.probe_fanout is not None and args.probe_fanout < 1:
+        parser.error("--probe-fanout must be at least 1")
+    if args.jitter < 0:
+        parser.error("--jitter cannot be negative")
 
-    net = Network(args.net_json_path, RouterClass, visualize=False)
+    if args.shards > 1:
+        from sharding import run_sharded
+
+        # Shards only simulate the routes, with the changes of the JSON file
+        unsupported = [
+            flag
+            for flag, value in [
+                ("--stop-when-converged", args.stop_when_converged),
+                ("--stability-window", args.stability_window is not None),
+                ("--report", args.report),
+                ("--probe-fanout", args.probe_fanout),
+                ("--flap-mtbf", args.flap_mtbf),
+                ("--crash-mtbf", args.crash_mtbf),
+                ("--trace", args.trace),
+                ("--packet-trace", args.packet_trace),
+                ("--replay", args.replay),
+            ]
+            if value
+        ]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be used with --shards")
+        try:
+            run_sharded(
+                args.net_json_path,
+                RouterClass,
+                args.shards,
+                jitter=args.jitter,
+                jitter_seed=args.jitter_seed,
+            )
+        except ValueError as error:
+            parser.error(str(error))
+        return
+
+    backend = args.backend
+    if args.trace or args.replay:
+        backend = "virtual"
+
+    net = Network(
+        args.net_json_path,
+        RouterClass,
+        visualize=False,
+        backend=backend,
+        stop_when_converged=args.stop_when_converged,
+        stability_window=args.stability_window,
+        report_path=args.report,
+        probe_fanout=args.probe_fanout,
+        jitter=args.jitter,
+        jitter_seed=args.jitter_seed,
+        trace_path=args.trace,
+        replay_path=args.replay,
+        packet_trace_path=args.packet_trace,
+    )
+    # When replaying, the random churn is part of the changes of the trace
+    if args.flap_mtbf and not args.replay:
+        net.add_link_flaps(args.flap_mtbf, args.flap_mttr, seed=args.churn_seed)
+    if args.crash_mtbf and not args.replay:
+        net.add_router_crashes(args.crash_mtbf, args.crash_mttr, seed=args.churn_seed)
     net.run()
 
 
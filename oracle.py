@@ -0,0 +1,220 @@
+import heapq
+import threading
+from array import array
+from router import Router
+
+try:
+    import numpy as np
+except ImportError:  # Routes are computed with one Dijkstra per destination instead
+    np = None
+
+INF = float("inf")
+
+
+class TopologyOracle:
+    """
+    The TopologyOracle class computes the shortest routes of a whole network at once,
+    from the links that are up: the distance of every address to every destination,
+    and the next hop of every router to every destination, for routers that only
+    forward packets (`OracleRouter`). Routes are computed once per version of the
+    topology: the network calls `invalidate` with a snapshot of the links when a change
+    is applied, and they are recomputed on the next lookup. The oracle never reads the
+    links of the network, which change while routers look routes up.
+
+    Dense networks are solved with NumPy, if installed, by a vectorized Floyd-Warshall
+    over a (router, address) distance matrix. Otherwise Dijkstra runs from every
+    destination over the reversed links, stored as compressed sparse row (CSR) arrays.
+
+    Parameters
+    ----------
+    routers
+        The addresses of the routers. Other addresses (clients) do not forward packets.
+    destinations
+        The addresses that routes are computed to (the clients of the network).
+    addresses
+        The address table of the network, whose ids index the next hops and
+        distances.
+    """
+
+    def __init__(self, routers, destinations, addresses):
+        self.routers = sorted(routers)
+        self.router_set = set(routers)
+        self.destinations = sorted(destinations)
+        self.addresses = addresses
+        # Address ids of the destinations, and the column of every id in the routes
+        self.dst_ids = [addresses.ids[dst] for dst in self.destinations]
+        self.columns = {dst_id: i for i, dst_id in enumerate(self.dst_ids)}
+        # (version, links that are up), replaced as a whole by `invalidate`
+        self.topology = (0, [])
+        self.computed_version = -1  # Version of the topology of the routes below
+        self.lock = threading.Lock()  # Routers look up next hops from several threads
+        # (distances, next ports), replaced as a whole by `update`. By destination
+        # column, arrays by address id of the distances (inf if unreachable) and of the
+        # ports of routers (-1 if unreachable).
+        self.routes = ([], [])
+
+    def invalidate(self, links):
+        """Mark the routes out of date, after the topology changed.
+
+        `links` are the links that are up, as [addr1, addr2, p1, p2, c12, c21] lists,
+        taken while no other change can be applied. They must not be modified after.
+        Costs are directional as in `Router.add_link`.
+        """
+        self.topology = (self.topology[0] + 1, links)
+
+    def update(self):
+        """Recompute the routes if the topology changed since they were computed."""
+        if self.computed_version == self.topology[0]:
+            return
+        with self.lock:
+            version, links = self.topology
+            if self.computed_version == version:
+                return
+            edges = self.edges(links)
+            # Floyd-Warshall takes cubic time whatever the number of links, so it only
+            # beats one Dijkstra per destination on dense networks
+            if np is not None and 8 * len(edges) >= len(self.routers) ** 2:
+                self.routes = self.floyd_warshall(edges)
+            else:
+                self.routes = self.dijkstra(edges)
+            self.computed_version = version
+
+    def next_port(self, router_id, dst_id):
+        """Return the port on which router id `router_id` forwards packets to address id
+        `dst_id`, or -1 if it is unreachable or not a destination.
+        """
+        if self.computed_version != self.topology[0]:
+            self.update()
+        column = self.columns.get(dst_id)
+        if column is None:
+            return -1
+        return self.routes[1][column][router_id]
+
+    def edges(self, links):
+        """Return `links` as directed edges (src id, dst id, cost, port) leaving
+        routers, sorted by src id.
+        """
+        ids = self.addresses.ids
+        edges = []
+        for addr1, addr2, p1, p2, c12, c21 in links:
+            if addr1 in self.router_set:
+                edges.append((ids[addr1], ids[addr2], c12, p1))
+            if addr2 in self.router_set:
+                edges.append((ids[addr2], ids[addr1], c21, p2))
+        edges.sort()
+        return edges
+
+    def floyd_warshall(self, edges):
+        size = len(self.addresses)
+        ids = self.addresses.ids
+        router_ids = np.array([ids[addr] for addr in self.routers], dtype=np.int64)
+        rows = np.full(size, -1, dtype=np.int64)  # Address id: router index
+        rows[router_ids] = np.arange(len(router_ids))
+
+        # Only routers forward packets, so only their rows are needed, and only they can
+        # be intermediate nodes
+        distances = np.full((len(router_ids), size), INF)
+        distances[np.arange(len(router_ids)), router_ids] = 0
+        next_ports = np.full((len(router_ids), size), -1, dtype=np.int32)
+        for src_id, dst_id, cost, port in edges:
+            row = rows[src_id]
+            if cost < distances[row, dst_id]:
+                distances[row, dst_id] = cost
+                next_ports[row, dst_id] = port
+        for row, node in enumerate(router_ids):
+            through = distances[:, node, None] + distances[row]
+            better = through < distances
+            np.copyto(distances, through, where=better)
+            np.copyto(next_ports, np.broadcast_to(next_ports[:, node, None], better.shape),
+                      where=better)
+
+        # Clients only reach themselves
+        dst_ids = np.array(self.dst_ids, dtype=np.int64)
+        columns = np.arange(len(dst_ids))
+        all_distances = np.full((len(dst_ids), size), INF)
+        all_distances[:, router_ids] = distances[:, dst_ids].T
+        all_distances[columns, dst_ids] = 0
+        all_ports = np.full((len(dst_ids), size), -1, dtype=np.int32)
+        all_ports[:, router_ids] = next_ports[:, dst_ids].T
+        return (
+            [array("d", column.tobytes()) for column in all_distances],
+            [array("i", column.tobytes()) for column in all_ports],
+        )
+
+    def dijkstra(self, edges):
+        size = len(self.addresses)
+        # CSR arrays of the reversed edges: the edges arriving at node id v are at
+        # offsets[v]:offsets[v + 1]
+        reverse = sorted(edges, key=lambda edge: edge[1])
+        offsets = array("i", [0]) * (size + 1)
+        for _, dst_id, _, _ in reverse:
+            offsets[dst_id + 1] += 1
+        for node in range(size):
+            offsets[node + 1] += offsets[node]
+        sources = array("i", (edge[0] for edge in reverse))
+        costs = array("d", (edge[2] for edge in reverse))
+        ports = array("i", (edge[3] for edge in reverse))
+
+        all_distances = []
+        all_ports = []
+        for dst_id in self.dst_ids:
+            distances = array("d", [INF]) * size
+            next_ports = array("i", [-1]) * size
+            distances[dst_id] = 0
+            pq = [(0, dst_id)]
+            while pq:
+                dist, node = heapq.heappop(pq)
+                if dist > distances[node]:
+                    continue
+                # Edges only leave routers, so routes only go through routers
+                for i in range(offsets[node], offsets[node + 1]):
+                    prev = sources[i]
+                    new_dist = dist + costs[i]
+                    if new_dist < distances[prev]:
+                        distances[prev] = new_dist
+                        next_ports[prev] = ports[i]
+                        heapq.heappush(pq, (new_dist, prev))
+            all_distances.append(distances)
+            all_ports.append(next_ports)
+        return all_distances, all_ports
+
+
+class OracleRouter(Router):
+    """
+    A router that sends no routing packets: it forwards traceroute packets with the
+    next hops of the network's `TopologyOracle`, which are always those of the current
+    topology. Use it when only the data plane matters.
+
+    Parameters
+    ----------
+    addr
+        The address of this router.
+    heartbeat_time
+        Unused.
+    oracle
+        The `TopologyOracle` of the network.
+    """
+
+    network_args = ("oracle",)
+
+    __slots__ = ("oracle", "self_id", "ids")
+
+    def __init__(self, addr, heartbeat_time=None, oracle=None):
+        Router.__init__(self, addr, heartbeat_time)
+        self.oracle = oracle
+        self.ids = oracle.addresses.ids
+        self.self_id = self.ids[addr]
+
+    def handle_packet(self, port, packet):
+        """Forward traceroute packets to their destination, drop other packets."""
+        if not packet.is_traceroute or packet.dst_addr == self.addr:
+            return
+        dst_id = self.ids.get(packet.dst_addr)
+        if dst_id is None:
+            return
+        next_port = self.oracle.next_port(self.self_id, dst_id)
+        if next_port >= 0:
+            self.send(next_port, packet)
+
+    def __repr__(self):
+        return f"OracleRouter(addr={self.addr})"
@@ -1,6 +1,3 @@
-import copy
-
-
 class Packet:
     """
     The Packet class defines packets that clients and routers send in the simulated
@@ -19,6 +16,8 @@ class Packet:
         The content of the packet. Must be a string.
     """
 
+    __slots__ = ("kind", "src_addr", "dst_addr", "content", "_route", "sent_time")
+
     TRACEROUTE = 1
     ROUTING = 2
 
@@ -27,18 +26,46 @@ class Packet:
         self.src_addr = src_addr
         self.dst_addr = dst_addr
         self.content = content
-        self.route = [src_addr]
+        # The route is a persistent linked list of (addr, parent) pairs, latest address
+        # first, so that copies of a packet share it and extending it is O(1)
+        self._route = (src_addr, None)
+        # Set by clients on traceroute packets, to tell how old the route is
+        self.sent_time = None
 
     def copy(self):
-        """Create a deep copy of the packet.
+        """Create a copy of the packet.
 
         This gets called automatically when the packet is sent to avoid aliasing issues.
+        The content is an immutable string and the route is persistent, so both are
+        shared with the copy and copying is O(1).
         """
-        content = copy.deepcopy(self.content)
-        p = Packet(self.kind, self.src_addr, self.dst_addr, content=content)
-        p.route = list(self.route)
+        p = Packet.__new__(Packet)
+        p.kind = self.kind
+        p.src_addr = self.src_addr
+        p.dst_addr = self.dst_addr
+        p.content = self.content
+        p._route = self._route
+        p.sent_time = self.sent_time
         return p
 
+    @property
+    def route(self):
+        """The list of addresses the packet went through, built on each access."""
+        route = []
+        node = self._route
+        while node is not None:
+            route.append(node[0])
+            node = node[1]
+        route.reverse()
+        return route
+
+    @route.setter
+    def route(self, route):
+        node = None
+        for addr in route:
+            node = (addr, node)
+        self._route = node
+
     @property
     def is_traceroute(self):
         """Returns True if the packet is a traceroute packet."""
@@ -51,7 +78,7 @@ class Packet:
 
     def add_to_route(self, addr):
         """DO NOT CALL from DVrouter or LSrouter!"""
-        self.route.append(addr)
+        self._route = (addr, self._route)
 
     def animate_send(self, src, dst, latency):
         """DO NOT CALL from DVrouter or LSrouter!"""
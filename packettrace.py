@@ -0,0 +1,200 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import namedtuple
+from packet import Packet
+
+try:
+    import numpy as np
+except ImportError:  # Only needed by `PacketTrace.to_numpy`
+    np = None
+
+# A packet trace is a binary file: a header, then fixed-size little-endian records.
+# Addresses and links are stored as ids, listed in a JSON file next to the trace
+# (the trace path followed by ".json"), written when the recorder is closed.
+HEADER = struct.Struct("<8sII")  # Magic, version, record size
+MAGIC = b"PKTTRACE"
+VERSION = 1
+# Time (ms), link id, event, direction, kind, src id, dst id, size (bytes of content)
+RECORD = struct.Struct("<dIBBBxIII")
+
+# Events
+SEND = 0
+RECV = 1
+CHANGE = 2
+
+# For SEND and RECV events, `kind` is Packet.TRACEROUTE or Packet.ROUTING, and the
+# direction is 0 from the first endpoint of the link to the second, 1 otherwise. For
+# CHANGE events, `kind` is an index in CHANGE_KINDS, src and dst are the ids of the
+# endpoints of the link (or src is the id of the router that crashed or restarted),
+# and the link id is that of the link before the change, if any.
+CHANGE_KINDS = ("up", "down", "cost", "crash", "restart")
+NONE = 0xFFFFFFFF  # Id of a missing address or link
+
+Record = namedtuple(
+    "Record", ["time", "link", "event", "direction", "kind", "src", "dst", "size"]
+)
+
+
+class PacketRecorder:
+    """
+    The PacketRecorder class writes packet and change events to a packet trace. Records
+    are packed into a preallocated buffer, which is appended to the file in bulk when
+    it is full, so recording a packet costs one `struct.pack_into`.
+
+    Parameters
+    ----------
+    path
+        The path of the trace file.
+    clock
+        A function returning the current time in ms.
+    addresses
+        The address table of the network, whose ids identify addresses in the trace.
+    capacity
+        The number of records held in memory before they are written.
+    """
+
+    def __init__(self, path, clock, addresses, capacity=1 << 16):
+        self.path = path
+        self.clock = clock
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self.buffer = bytearray(RECORD.size * capacity)
+        self.end = len(self.buffer)
+        self.offset = 0  # Where the next record is packed in the buffer
+        self.lock = threading.Lock()  # Links send from several threads
+        self.links = []  # Endpoints of every link, by link id
+        self.addresses = addresses
+        self.ids = addresses.ids
+
+    def add_link(self, link):
+        """Give `link` an id and make it record its packets."""
+        link.trace_id = len(self.links)
+        link.recorder = self
+        self.links.append([link.e1, link.e2])
+
+    def record(self, event, link_id, direction, packet):
+        """Record a packet sent or received on a link."""
+        ids = self.ids
+        content = packet.content
+        with self.lock:
+            RECORD.pack_into(
+                self.buffer,
+                self.offset,
+                self.clock(),
+                link_id,
+                event,
+                direction,
+                Packet.TRACEROUTE
+                if packet.kind == Packet.TRACEROUTE
+                else Packet.ROUTING,
+                ids.get(packet.src_addr, NONE),
+                ids.get(packet.dst_addr, NONE),
+                len(content) if content else 0,
+            )
+            self.offset += RECORD.size
+            if self.offset == self.end:
+                self.flush()
+
+    def record_change(self, change, addr1, addr2, link):
+        """Record a change of link (addr1, addr2), or of router addr1 if addr2 is
+        None. `link` is the link before the change, or None.
+        """
+        with self.lock:
+            RECORD.pack_into(
+                self.buffer,
+                self.offset,
+                self.clock(),
+                NONE if link is None else link.trace_id,
+                CHANGE,
+                0,
+                CHANGE_KINDS.index(change),
+                self.ids.get(addr1, NONE),
+                self.ids.get(addr2, NONE),
+                0,
+            )
+            self.offset += RECORD.size
+            if self.offset == self.end:
+                self.flush()
+
+    def flush(self):
+        """Append the records in the buffer to the file. The lock must be held."""
+        self.file.write(memoryview(self.buffer)[: self.offset])
+        self.offset = 0
+
+    def close(self):
+        """Write the remaining records and the addresses and links of the trace."""
+        with self.lock:
+            self.flush()
+            self.file.close()
+        with open(self.path + ".json", "w") as f:
+            json.dump({"addresses": self.addresses.names, "links": self.links}, f)
+
+
+class PacketTrace:
+    """
+    The PacketTrace class reads a packet trace. The file is memory-mapped, so records
+    are only read as they are used.
+
+    Parameters
+    ----------
+    path
+        The path of the trace file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.addresses = []  # Address by id
+        self.links = []  # Endpoints by link id
+        if os.path.exists(path + ".json"):
+            with open(path + ".json", "r") as f:
+                info = json.load(f)
+            self.addresses = info["addresses"]
+            self.links = info["links"]
+        with open(path, "rb") as f:
+            magic, version, record_size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                raise ValueError(f"{path} is not a packet trace of version {VERSION}")
+            size = os.fstat(f.fileno()).st_size
+            # An interrupted recording may end with a partial record
+            self.num_records = (size - HEADER.size) // RECORD.size
+            self.data = b""
+            if self.num_records > 0:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.num_records
+
+    def __iter__(self):
+        """Generate the records of the trace, in the order they were recorded."""
+        end = HEADER.size + self.num_records * RECORD.size
+        for fields in RECORD.iter_unpack(memoryview(self.data)[HEADER.size : end]):
+            yield Record(*fields)
+
+    def name(self, addr_id):
+        """Return the address of an address id, or None."""
+        return None if addr_id == NONE else self.addresses[addr_id]
+
+    def to_numpy(self):
+        """Return the records as a NumPy structured array backed by the file."""
+        if np is None:
+            raise ImportError("numpy is required to read traces as arrays")
+        dtype = np.dtype(
+            {
+                "names": Record._fields,
+                "formats": ["<f8", "<u4", "u1", "u1", "u1", "<u4", "<u4", "<u4"],
+                "offsets": [0, 8, 12, 13, 14, 16, 20, 24],
+                "itemsize": RECORD.size,
+            }
+        )
+        if self.num_records == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(
+            self.path,
+            dtype=dtype,
+            mode="r",
+            offset=HEADER.size,
+            shape=(self.num_records,),
+        )
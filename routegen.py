@@ -0,0 +1,191 @@
+import argparse
+import json
+from collections import defaultdict
+from changes import final_links
+from lsdb import AddressTable
+from oracle import INF, TopologyOracle
+from scenario import dump_jsonl, load_scenario
+
+try:
+    import numpy as np
+except ImportError:  # Edges on shortest routes are found one destination at a time
+    np = None
+
+# The correct routes of a scenario are written compactly as "correct_route_dags": for
+# every destination client, a dict mapping every address that has a shortest route to
+# it (source clients included) to the sorted list of next hops on shortest routes.
+# Every path that follows next hops from a client to the destination is a correct
+# route, so the number of routes listed per pair does not matter. Routes can be listed
+# with `expand_routes`, and `scenario.CorrectRoutes` checks routes against the DAGs.
+
+
+def shortest_route_edges(distances, edges):
+    """Return, for every destination column of `distances` (as computed by
+    `TopologyOracle`), the indices in `edges` (src id, dst id, cost, port) of the edges
+    that are on a shortest route to it: those whose cost plus the distance from their
+    end is the distance from their start.
+
+    With NumPy, all edges are checked against all destinations at once.
+    """
+    if np is not None and edges and distances:
+        matrix = np.stack([np.frombuffer(column, dtype=np.float64) for column in distances])
+        srcs = np.array([edge[0] for edge in edges])
+        dsts = np.array([edge[1] for edge in edges])
+        costs = np.array([edge[2] for edge in edges], dtype=np.float64)
+        remaining = matrix[:, srcs]
+        on_route = (remaining < INF) & (costs + matrix[:, dsts] == remaining)
+        columns, rows = np.nonzero(on_route)
+        by_destination = [[] for _ in distances]
+        for column, row in zip(columns.tolist(), rows.tolist()):
+            by_destination[column].append(row)
+        return by_destination
+
+    by_destination = []
+    for column in distances:
+        on_route = []
+        for i, (src_id, dst_id, cost, _) in enumerate(edges):
+            remaining = column[src_id]
+            if remaining < INF and cost + column[dst_id] == remaining:
+                on_route.append(i)
+        by_destination.append(on_route)
+    return by_destination
+
+
+def correct_route_dags(routers, clients, links):
+    """Compute the DAG of next hops on shortest routes to every client (see above)
+    for the network with the given links up.
+
+    Distances are those of a `TopologyOracle` of the network. Costs are directional as
+    in `Router.add_link`, and clients only appear at the ends of routes.
+    """
+    addresses = AddressTable()
+    for addr in sorted(set(routers) | set(clients)):
+        addresses.intern(addr)
+    oracle = TopologyOracle(routers, clients, addresses)
+    oracle.invalidate(links)
+    oracle.update()
+    distances, _ = oracle.routes
+    edges = oracle.edges(links)
+    route_edges = shortest_route_edges(distances, edges)
+    destinations = oracle.destinations
+    names = addresses.names
+
+    attached = defaultdict(list)  # Client: routers it is linked to
+    client_set = set(clients)
+    for addr1, addr2, *_ in links:
+        if addr1 in client_set:
+            attached[addr1].append(addr2)
+        if addr2 in client_set:
+            attached[addr2].append(addr1)
+
+    dags = {}
+    for column, dst in enumerate(destinations):
+        next_hops = defaultdict(list)
+        for i in route_edges[column]:
+            src_id, hop_id, _, _ = edges[i]
+            next_hops[names[src_id]].append(names[hop_id])
+        sources = []
+        for client in destinations:
+            for router in attached[client]:
+                if router in next_hops:
+                    next_hops[client].append(router)
+                    sources.append(client)
+        # Only keep the nodes on a route from a client
+        on_routes = set(sources)
+        stack = list(sources)
+        while stack:
+            for hop in next_hops.get(stack.pop(), ()):
+                if hop not in on_routes:
+                    on_routes.add(hop)
+                    stack.append(hop)
+        if sources:
+            dags[dst] = {
+                node: sorted(next_hops[node]) for node in sorted(on_routes) if next_hops[node]
+            }
+    return dags
+
+
+def expand_routes(src, dst, next_hops, max_paths=None):
+    """Generate the routes from `src` to `dst` in the DAG `next_hops`, in sorted
+    order, up to `max_paths` of them.
+    """
+    if src not in next_hops:
+        return
+    count = 0
+    stack = [[src]]
+    while stack:
+        route = stack.pop()
+        node = route[-1]
+        if node == dst and len(route) > 1:
+            yield route
+            count += 1
+            if count == max_paths:
+                return
+            continue
+        for hop in reversed(next_hops.get(node, ())):
+            stack.append(route + [hop])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute the correct routes of a network simulation configuration "
+        "file: every equal-cost shortest route between clients, after all its changes."
+    )
+    parser.add_argument("net_json_path", help="Scenario file (JSON or JSON Lines).")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Output path (default: stdout). Paths ending with .jsonl are written in "
+        "the JSON Lines format.",
+    )
+    parser.add_argument(
+        "--expand",
+        action="store_true",
+        help="Write the routes as correct_routes lists instead of DAGs of next hops.",
+    )
+    parser.add_argument(
+        "--max-paths",
+        type=int,
+        default=1000,
+        help="With --expand, the maximum number of routes per pair of clients. Pairs "
+        "with more routes are an error, since a partial list would reject correct "
+        "routes.",
+    )
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.net_json_path)
+    links = final_links(scenario["links"], scenario.get("changes", []))
+    dags = correct_route_dags(scenario["routers"], scenario["clients"], links)
+    del scenario["correct_routes"]
+    if args.expand:
+        routes = []
+        for src in sorted(scenario["clients"]):
+            for dst, next_hops in dags.items():
+                pair_routes = list(
+                    expand_routes(src, dst, next_hops, args.max_paths + 1)
+                )
+                if len(pair_routes) > args.max_paths:
+                    parser.error(
+                        f"{src} -> {dst} has more than {args.max_paths} correct routes: "
+                        "raise --max-paths or write DAGs"
+                    )
+                routes.extend(pair_routes)
+        scenario["correct_routes"] = routes
+    else:
+        scenario["correct_route_dags"] = dags
+
+    if not (args.output and args.output.endswith(".jsonl")):
+        # Changes of a JSON Lines file are read lazily, the JSON format lists them all
+        scenario["changes"] = list(scenario.get("changes", []))
+    if args.output:
+        with open(args.output, "w") as f:
+            if args.output.endswith(".jsonl"):
+                dump_jsonl(scenario, f)
+            else:
+                json.dump(scenario, f)
+    else:
+        print(json.dumps(scenario))
+
+
+if __name__ == "__main__":
+    main()
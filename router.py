@@ -1,5 +1,8 @@
 import time
 import queue
+import threading
+from metrics import PacketCounter
+from scheduler import wait_event
 
 
 class Router:
@@ -21,13 +24,36 @@ class Router:
         The address of this router.
     heartbeat_time
         Routing information should be sent at least once every heartbeat_time ms.
+
+    Subclasses that need state shared by the whole network list the names of the
+    keyword arguments they take in `network_args`: the network passes its attributes
+    of the same names ("addresses", "infinity" or "oracle") when it creates routers.
     """
 
+    network_args = ()
+
+    __slots__ = ("addr", "links", "link_changes", "keep_running", "wakeup",
+                 "tick_interval", "sent", "received", "route_computations")
+
     def __init__(self, addr, heartbeat_time=None):
         self.addr = addr
         self.links = {}  # Links indexed by port
         self.link_changes = queue.Queue()  # Thread-safe queue for link changes
         self.keep_running = True
+        # Set by links and link changes to wake the main loop up. The network may
+        # replace it with any object that has a `set` method.
+        self.wakeup = threading.Event()
+        # Longest time (in ms) between two calls to `handle_time`
+        self.tick_interval = heartbeat_time / 10 if heartbeat_time else 100
+        # Statistics reported by the network. Subclasses should increment
+        # `route_computations` whenever they recompute their routes (SPF, DV update).
+        self.sent = PacketCounter()
+        self.received = PacketCounter()
+        self.route_computations = 0
+
+    def notify(self):
+        """Wake the main loop of the router up."""
+        self.wakeup.set()
 
     def change_link(self, change):
         """Add, remove, or change the cost of a link.
@@ -35,12 +61,14 @@ class Router:
         The `change` argument is a tuple with first element being "add" or "remove".
         """
         self.link_changes.put(change)
+        self.notify()
 
     def add_link(self, port, endpointAddr, link, cost):
         """Add new link to router."""
         if port in self.links:
             self.remove_link(port)
         self.links[port] = link
+        link.attach(self.addr, self.notify)
         self.handle_new_link(port, endpointAddr, cost)
 
     def remove_link(self, port):
@@ -49,30 +77,52 @@ class Router:
         self.handle_remove_link(port)
 
     def run(self):
-        """Main loop of router."""
+        """Main loop of router.
+
+        Sleep until a packet or link change arrives, or at most `tick_interval` ms.
+        """
         while self.keep_running:
-            time.sleep(0.1)
-            time_ms = int(round(time.time() * 1000))
+            self.wakeup.wait(self.tick_interval / 1000)
+            self.wakeup.clear()
+            self.tick(int(round(time.time() * 1000)))
+
+    async def run_async(self):
+        """Main loop of router as a coroutine. `wakeup` must be an `asyncio.Event`."""
+        while self.keep_running:
+            await wait_event(self.wakeup, self.tick_interval / 1000)
+            self.wakeup.clear()
+            self.tick(int(round(time.time() * 1000)))
+
+    def tick(self, time_ms):
+        """Apply all pending link changes, process all received packets and the time.
+
+        This is called by `run` whenever the router wakes up, or by the network's event
+        queue when the simulation runs in virtual time.
+        """
+        while True:
             try:
                 change = self.link_changes.get_nowait()
-                if change[0] == "add":
-                    self.add_link(*change[1:])
-                elif change[0] == "remove":
-                    self.remove_link(*change[1:])
             except queue.Empty:
-                pass
-            for port in self.links.keys():
-                packet = self.links[port].recv(self.addr)
-                if packet:
-                    self.handle_packet(port, packet)
-            self.handle_time(time_ms)
+                break
+            if change[0] == "add":
+                self.add_link(*change[1:])
+            elif change[0] == "remove":
+                self.remove_link(*change[1:])
+        for port, link in list(self.links.items()):
+            packet = link.recv(self.addr)
+            while packet:
+                self.received.count(packet)
+                self.handle_packet(port, packet)
+                packet = link.recv(self.addr)
+        self.handle_time(time_ms)
 
     def send(self, port, packet):
         """Send a packet out given port."""
         try:
             self.links[port].send(packet, self.addr)
         except KeyError:
-            pass
+            return
+        self.sent.count(packet)
 
     def handle_packet(self, port, packet):
         """Process incoming packet.
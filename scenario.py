@@ -0,0 +1,190 @@
+import json
+from changes import sorted_changes
+from lsdb import AddressTable
+
+# Keys of JSON Lines records that hold a single setting, and those that add an item to
+# a list of the scenario
+SETTINGS = ("end_time", "client_send_rate", "visualize")
+ITEMS = {"router": "routers", "client": "clients", "link": "links", "change": "changes"}
+
+
+class CorrectRoutes:
+    """
+    The CorrectRoutes class stores the correct routes of a scenario compactly: only
+    the hash of each route (a tuple of addresses) and the (src, dst) pairs that have
+    correct routes, as integers, are kept. Memory is a few ints per route instead of a
+    list of addresses. Two routes with the same 64-bit hash are practically
+    impossible, but would be confused.
+
+    Routes to a destination can also be given as a DAG of next hops (see `add_dag`),
+    which holds every equal-cost route in one entry per node, however many routes
+    there are. Routes are checked by walking the DAG and are never listed.
+    """
+
+    __slots__ = ("addresses", "pairs", "hashes", "dags")
+
+    def __init__(self, routes=()):
+        self.addresses = AddressTable()  # Ids of the endpoints of routes
+        self.pairs = set()  # src id << 32 | dst id, for every pair with correct routes
+        self.hashes = set()
+        self.dags = {}  # dst id: {node id: frozenset of next hop ids}
+        for route in routes:
+            self.add(route)
+
+    def add(self, route):
+        """Add a correct route (a list of addresses from src to dst)."""
+        src_id = self.addresses.intern(route[0])
+        dst_id = self.addresses.intern(route[-1])
+        self.pairs.add(src_id << 32 | dst_id)
+        self.hashes.add(hash(tuple(route)))
+
+    def add_dag(self, dst, next_hops, sources):
+        """Add the correct routes to `dst` from every address of `sources` that is in
+        `next_hops`, a dict mapping addresses to the list of next hops to `dst` on
+        shortest routes (as written by `routegen.py`).
+        """
+        intern = self.addresses.intern
+        dst_id = intern(dst)
+        self.dags[dst_id] = {
+            intern(node): frozenset(intern(hop) for hop in hops)
+            for node, hops in next_hops.items()
+        }
+        for src in sources:
+            if src in next_hops:
+                self.pairs.add(intern(src) << 32 | dst_id)
+
+    def is_correct(self, route):
+        """Return whether `route` (a list of addresses) is a correct route."""
+        if len(route) == 0:
+            return False
+        if hash(tuple(route)) in self.hashes:
+            return True
+        ids = self.addresses.ids
+        src_id, dst_id = ids.get(route[0]), ids.get(route[-1])
+        dag = self.dags.get(dst_id)
+        if dag is None or src_id is None or (src_id << 32 | dst_id) not in self.pairs:
+            return False
+        for node, hop in zip(route, route[1:]):
+            if ids.get(hop) not in dag.get(ids.get(node), ()):
+                return False
+        return True
+
+    def __contains__(self, pair):
+        ids = self.addresses.ids
+        src, dst = pair
+        return src in ids and dst in ids and (ids[src] << 32 | ids[dst]) in self.pairs
+
+    def __iter__(self):
+        """Iterate over the (src, dst) pairs that have correct routes."""
+        names = self.addresses.names
+        for key in self.pairs:
+            yield names[key >> 32], names[key & 0xFFFFFFFF]
+
+    def __len__(self):
+        return len(self.pairs)
+
+
+class JsonlChanges:
+    """
+    The JsonlChanges class stands for the changes of a JSON Lines scenario without
+    holding them: every iteration reads the "change" records of the file again, one
+    line at a time, so changes are never all in memory. They must be in time order in
+    the file (`changes.ChangeSchedule` raises a ValueError otherwise).
+    """
+
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, "r") as f:
+            for line in f:
+                if '"change"' not in line:
+                    continue
+                ((key, value),) = json.loads(line).items()
+                if key == "change":
+                    yield value
+
+
+def load_scenario(path):
+    """Load a network simulation configuration file.
+
+    Files ending with ".jsonl" are read one line at a time (see `load_jsonl`), and
+    their changes are only read as they are used (see `JsonlChanges`). Other files are
+    read as a single JSON object (the format of the bundled files). Either way, the
+    correct routes are returned as a `CorrectRoutes`, with those of the optional
+    "correct_route_dags" (a dict mapping destinations to DAGs of next hops, see
+    `CorrectRoutes.add_dag`).
+    """
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            return load_jsonl(f, changes=JsonlChanges(path))
+        scenario = json.load(f)
+    correct_routes = CorrectRoutes(scenario.get("correct_routes", []))
+    for dst, next_hops in scenario.get("correct_route_dags", {}).items():
+        correct_routes.add_dag(dst, next_hops, scenario["clients"])
+    scenario["correct_routes"] = correct_routes
+    return scenario
+
+
+def load_jsonl(lines, changes=None):
+    """Load a scenario in the JSON Lines format.
+
+    Each non-empty line is a JSON object with a single key: "end_time",
+    "client_send_rate" or "visualize" with the value of the setting, or "router",
+    "client", "link", "change" or "correct_route" with one item of the corresponding
+    list of the JSON format, e.g. {"link": ["A", "B", 1, 1, 5, 5]}. Correct routes are
+    added to a `CorrectRoutes` as they are read, so they are never all in memory.
+    "correct_route_dag" records hold one item of "correct_route_dags" as
+    {"dst": dst, "next_hops": next_hops}.
+
+    If `changes` is given (e.g. a `JsonlChanges` of the same file), "change" records
+    are skipped and `changes` is used as the changes of the scenario.
+    """
+    scenario = {key: [] for key in ITEMS.values()}
+    correct_routes = CorrectRoutes()
+    dags = []  # Added once all clients are known
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        ((key, value),) = json.loads(line).items()
+        if key == "correct_route":
+            correct_routes.add(value)
+        elif key == "change" and changes is not None:
+            continue
+        elif key == "correct_route_dag":
+            dags.append(value)
+        elif key in ITEMS:
+            scenario[ITEMS[key]].append(value)
+        elif key in SETTINGS:
+            scenario[key] = value
+        else:
+            raise ValueError(f"line {line_number}: unknown record {key!r}")
+    for dag in dags:
+        correct_routes.add_dag(dag["dst"], dag["next_hops"], scenario["clients"])
+    scenario["correct_routes"] = correct_routes
+    if changes is not None:
+        scenario["changes"] = changes
+    return scenario
+
+
+def dump_jsonl(scenario, f):
+    """Write a scenario dict in the JSON format to the file `f` as JSON Lines.
+
+    Changes are written in time order, so that they can be read lazily.
+    """
+    for key in SETTINGS:
+        if key in scenario:
+            f.write(json.dumps({key: scenario[key]}) + "\n")
+    for key, list_key in ITEMS.items():
+        items = scenario.get(list_key, [])
+        if list_key == "changes" and isinstance(items, list):
+            items = sorted_changes(items)
+        for item in items:
+            f.write(json.dumps({key: item}) + "\n")
+    for route in scenario.get("correct_routes", []):
+        f.write(json.dumps({"correct_route": route}) + "\n")
+    for dst, next_hops in scenario.get("correct_route_dags", {}).items():
+        record = {"dst": dst, "next_hops": next_hops}
+        f.write(json.dumps({"correct_route_dag": record}) + "\n")
@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+
+class EventQueue:
+    """
+    The EventQueue class is a discrete-event scheduler driven by a virtual clock. It
+    replaces wall-clock sleeps so that a simulation runs as fast as the CPU allows.
+
+    Events are callbacks kept in a heap ordered by their timestamp (in ms). Events with
+    the same timestamp run in the order in which they were scheduled.
+
+    Parameters
+    ----------
+    start_time
+        The virtual time (in ms) at which the clock starts.
+    """
+
+    def __init__(self, start_time=0):
+        self.time = start_time
+        self._heap = []
+        self._counter = itertools.count()
+
+    def now(self):
+        """Return the current virtual time in ms."""
+        return self.time
+
+    def call_at(self, time_ms, fn, *args):
+        """Schedule `fn(*args)` to run at virtual time `time_ms`."""
+        heapq.heappush(self._heap, (time_ms, next(self._counter), fn, args))
+
+    def call_later(self, delay_ms, fn, *args):
+        """Schedule `fn(*args)` to run `delay_ms` after the current virtual time."""
+        self.call_at(self.time + delay_ms, fn, *args)
+
+    def run_until(self, end_time):
+        """Run all events scheduled at or before `end_time`, advancing the clock."""
+        heap = self._heap
+        while heap and heap[0][0] <= end_time:
+            time_ms, _, fn, args = heapq.heappop(heap)
+            self.time = time_ms
+            fn(*args)
+        self.time = max(self.time, end_time)
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class EventTrigger:
+    """
+    The EventTrigger class schedules `fn(*args)` on an EventQueue as soon as possible
+    whenever `set` is called. Calls to `set` made before `fn` runs are coalesced. It
+    can replace a `threading.Event` used to wake a main loop up in virtual time.
+    """
+
+    def __init__(self, scheduler, fn, *args):
+        self.scheduler = scheduler
+        self.fn = fn
+        self.args = args
+        self.pending = False
+
+    def set(self):
+        if not self.pending:
+            self.pending = True
+            self.scheduler.call_later(0, self._fire)
+
+    def _fire(self):
+        self.pending = False
+        self.fn(*self.args)
+
+
+class TimerThread(threading.Thread):
+    """
+    The TimerThread class is a heap-backed delay queue that runs scheduled callbacks in
+    real time from a single thread. All links of a network share one TimerThread
+    instead of starting a new thread for every packet.
+
+    Callbacks should be short since they are run one after another.
+    """
+
+    def __init__(self):
+        threading.Thread.__init__(self, daemon=True)
+        self._heap = []
+        self._counter = itertools.count()
+        self._cv = threading.Condition()
+        self.keep_running = True
+
+    def now(self):
+        """Return the current wall-clock time in ms."""
+        return time.time() * 1000
+
+    def call_at(self, time_ms, fn, *args):
+        """Schedule `fn(*args)` to run at wall-clock time `time_ms`."""
+        with self._cv:
+            event = (time_ms, next(self._counter), fn, args)
+            heapq.heappush(self._heap, event)
+            # Only wake the thread if the earliest deadline changed
+            if self._heap[0] is event:
+                self._cv.notify()
+
+    def call_later(self, delay_ms, fn, *args):
+        """Schedule `fn(*args)` to run `delay_ms` from now."""
+        self.call_at(self.now() + delay_ms, fn, *args)
+
+    def run(self):
+        heap = self._heap
+        with self._cv:
+            while self.keep_running:
+                if not heap:
+                    self._cv.wait()
+                    continue
+                wait_time = heap[0][0] - self.now()
+                if wait_time > 0:
+                    self._cv.wait(wait_time / 1000)
+                    continue
+                _, _, fn, args = heapq.heappop(heap)
+                self._cv.release()
+                try:
+                    fn(*args)
+                finally:
+                    self._cv.acquire()
+
+    def join(self, timeout=None):
+        with self._cv:
+            self.keep_running = False
+            self._cv.notify()
+        super(TimerThread, self).join(timeout)
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class AsyncioScheduler:
+    """
+    The AsyncioScheduler class schedules callbacks on an asyncio event loop with the
+    same interface as TimerThread. Times are in ms of the loop's monotonic clock.
+
+    The `loop` field must be set to the running loop before scheduling callbacks.
+    """
+
+    def __init__(self, loop=None):
+        self.loop = loop
+
+    def now(self):
+        """Return the loop's current time in ms."""
+        return self.loop.time() * 1000
+
+    def call_at(self, time_ms, fn, *args):
+        """Schedule `fn(*args)` to run at loop time `time_ms`."""
+        self.loop.call_at(time_ms / 1000, fn, *args)
+
+    def call_later(self, delay_ms, fn, *args):
+        """Schedule `fn(*args)` to run `delay_ms` from now."""
+        self.loop.call_later(delay_ms / 1000, fn, *args)
+
+
+async def wait_event(event, timeout):
+    """Wait until the asyncio `event` is set or `timeout` seconds have passed."""
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
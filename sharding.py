@@ -0,0 +1,251 @@
+import multiprocessing
+import sys
+from collections import defaultdict, deque
+from link import Link
+from network import Network
+from scenario import load_scenario
+
+
+def partition(routers, clients, links, num_shards):
+    """Partition routers and clients into `num_shards` shards.
+
+    Routers are ordered by a breadth-first traversal of the graph formed by `links`
+    (starting from the smallest address of each connected component), and the order is
+    cut into contiguous shards of equal size, so that neighboring routers tend to end up
+    in the same shard. Each client joins the shard of the router it is linked to.
+
+    Returns a dict mapping each address to its shard index.
+    """
+    neighbors = defaultdict(set)
+    for addr1, addr2, *_ in links:
+        neighbors[addr1].add(addr2)
+        neighbors[addr2].add(addr1)
+    router_set = set(routers)
+    order = []
+    seen = set()
+    for root in sorted(routers):
+        if root in seen:
+            continue
+        seen.add(root)
+        frontier = deque([root])
+        while frontier:
+            addr = frontier.popleft()
+            order.append(addr)
+            for neighbor in sorted(neighbors[addr]):
+                if neighbor in router_set and neighbor not in seen:
+                    seen.add(neighbor)
+                    frontier.append(neighbor)
+    shard_size = max(1, -(-len(order) // num_shards))
+    shard_of = {addr: i // shard_size for i, addr in enumerate(order)}
+    for client in clients:
+        attached = [addr for addr in sorted(neighbors[client]) if addr in shard_of]
+        shard_of[client] = shard_of[attached[0]] if attached else 0
+    return shard_of
+
+
+class RemoteScheduler:
+    """
+    The RemoteScheduler class stands in for the scheduler of a link whose other endpoint
+    is simulated by another shard. Instead of scheduling the delivery locally, it puts
+    the packet in the outbox of the network, to be forwarded to the other shard.
+    """
+
+    def __init__(self, network, key, generation):
+        self.network = network
+        self.key = key
+        self.generation = generation
+
+    def now(self):
+        return self.network.scheduler.now()
+
+    def call_at(self, time_ms, fn, packet, src):
+        self.network.outbox.append((time_ms, self.key, self.generation, src, packet))
+
+
+class ShardNetwork(Network):
+    """A Network that only simulates the routers and clients of one shard.
+
+    The shard runs in virtual time. Packets sent on links to other shards are collected
+    in `outbox`, and packets sent by other shards are delivered with `receive`.
+
+    Parameters
+    ----------
+    net_json_path, RouterClass
+        See `Network`.
+    shard
+        The index of this shard.
+    shard_of
+        A dict mapping each address to its shard index, as returned by `partition`.
+    jitter, jitter_seed
+        See `Network`. Every shard draws the same jitter for the same link.
+    """
+
+    def __init__(
+        self, net_json_path, RouterClass, shard, shard_of, jitter=0, jitter_seed=0
+    ):
+        self.shard = shard
+        self.shard_of = shard_of
+        self.outbox = []
+        self.generations = {}  # Number of links created so far, by link key
+        Network.__init__(
+            self,
+            net_json_path,
+            RouterClass,
+            backend="virtual",
+            jitter=jitter,
+            jitter_seed=jitter_seed,
+        )
+
+    def is_local(self, addr):
+        return self.shard_of.get(addr) == self.shard
+
+    def parse_routers(self, router_params, RouterClass):
+        local_params = [addr for addr in router_params if self.is_local(addr)]
+        return Network.parse_routers(self, local_params, RouterClass)
+
+    def parse_clients(self, client_params, client_send_rate):
+        clients = Network.parse_clients(self, client_params, client_send_rate)
+        return {addr: c for addr, c in clients.items() if self.is_local(addr)}
+
+    def create_link(self, addr1, addr2, c12, c21):
+        # Links are numbered so that packets sent on a link that has since gone down
+        # are not delivered on a new link between the same endpoints
+        key = (addr1, addr2)
+        generation = self.generations.get(key, 0) + 1
+        self.generations[key] = generation
+        scheduler = self.scheduler
+        if self.is_local(addr1) != self.is_local(addr2):
+            scheduler = RemoteScheduler(self, key, generation)
+        return Link(
+            addr1,
+            addr2,
+            c12,
+            c21,
+            self.latency_multiplier,
+            scheduler,
+            jitter=self.jitter,
+            seed=self.jitter_seed,
+        )
+
+    def receive(self, messages):
+        """Schedule the delivery of packets sent by other shards."""
+        for time_ms, key, generation, src, packet in messages:
+            if self.generations.get(key) == generation and key in self.links:
+                link = self.links[key][4]
+                self.scheduler.call_at(time_ms, link._deliver, packet, src)
+
+    def take_outbox(self):
+        outbox, self.outbox = self.outbox, []
+        return outbox
+
+
+def run_shard(conn, net_json_path, RouterClass, shard, shard_of, jitter, jitter_seed):
+    """Simulate one shard in a worker process, following the coordinator's commands."""
+    net = ShardNetwork(
+        net_json_path, RouterClass, shard, shard_of, jitter, jitter_seed
+    )
+    net.start_virtual()
+    while True:
+        command, *args = conn.recv()
+        if command == "run":
+            end_time, messages = args
+            net.receive(messages)
+            net.scheduler.run_until(end_time)
+            net.check_convergence()  # Also drops the traceroutes tracked meanwhile
+            conn.send(net.take_outbox())
+        elif command == "last_send":
+            net.reset_routes()
+            for client in net.clients.values():
+                client.last_send()
+            conn.send(net.take_outbox())
+        elif command == "routes":
+            conn.send(net.routes)
+            return
+
+
+def run_sharded(net_json_path, RouterClass, num_shards, jitter=0, jitter_seed=0):
+    """Run the network in virtual time, split into `num_shards` worker processes.
+
+    Shards synchronize conservatively: the coordinator advances all shards by windows no
+    longer than the smallest latency of a link between two shards (the lookahead), so a
+    packet sent across shards during a window always arrives in a later window. Packets
+    are exchanged between windows. Print the final routes. Jitter only adds to
+    latencies, so it does not change the lookahead.
+    """
+    net_json = load_scenario(net_json_path)
+    all_links = list(net_json["links"])
+    for _, target, change in net_json.get("changes", []):
+        if change == "up":
+            all_links.append(target)
+        elif change == "cost":
+            # Only the costs matter for the lookahead
+            addr1, addr2, c12, c21 = target
+            all_links.append([addr1, addr2, None, None, c12, c21])
+    shard_of = partition(
+        net_json["routers"], net_json["clients"], all_links, num_shards
+    )
+
+    # The coordinator simulates no router or client, it only merges the routes
+    net = ShardNetwork(net_json_path, RouterClass, None, shard_of)
+    lookahead = float("inf")
+    for addr1, addr2, _, _, c12, c21 in all_links:
+        if shard_of[addr1] != shard_of[addr2]:
+            lookahead = min(lookahead, min(c12, c21) * net.latency_multiplier)
+    if lookahead <= 0:
+        raise ValueError(
+            "a link between two shards has cost 0, so shards could never advance "
+            "virtual time; run with fewer shards"
+        )
+
+    shards = sorted(set(shard_of.values()))
+    conns = {}
+    processes = []
+    for shard in shards:
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=run_shard,
+            args=(
+                child_conn,
+                net_json_path,
+                RouterClass,
+                shard,
+                shard_of,
+                jitter,
+                jitter_seed,
+            ),
+            daemon=True,
+        )
+        process.start()
+        conns[shard] = parent_conn
+        processes.append(process)
+
+    inboxes = {shard: [] for shard in shards}
+
+    def dispatch(messages):
+        for message in messages:
+            (addr1, addr2), src = message[1], message[3]
+            inboxes[shard_of[addr2 if src == addr1 else addr1]].append(message)
+
+    current_time = 0
+    for phase_end in (net.end_time, net.end_time + 4 * net.client_send_rate):
+        while current_time < phase_end:
+            current_time = min(current_time + lookahead, phase_end)
+            for shard in shards:
+                messages = sorted(inboxes[shard], key=lambda message: message[0])
+                inboxes[shard] = []
+                conns[shard].send(("run", current_time, messages))
+            for shard in shards:
+                dispatch(conns[shard].recv())
+        if phase_end == net.end_time:
+            for shard in shards:
+                conns[shard].send(("last_send",))
+            for shard in shards:
+                dispatch(conns[shard].recv())
+
+    for shard in shards:
+        conns[shard].send(("routes",))
+    for shard in shards:
+        net.merge_routes(conns[shard].recv())
+    for process in processes:
+        process.join()
+    sys.stdout.write("\n" + net.get_route_string() + "\n")
@@ -0,0 +1,251 @@
+import argparse
+import json
+import math
+import random
+from collections import defaultdict
+from routegen import correct_route_dags
+from scenario import dump_jsonl
+
+
+def ring(n, rng):
+    """Routers on a cycle."""
+    return n, [(i, (i + 1) % n) for i in range(n)] if n > 2 else [(0, 1)]
+
+
+def grid(n, rng):
+    """Routers on the smallest square grid with at least `n` routers."""
+    side = max(2, math.ceil(math.sqrt(n)))
+    edges = []
+    for r in range(side):
+        for c in range(side):
+            i = r * side + c
+            if c + 1 < side:
+                edges.append((i, i + 1))
+            if r + 1 < side:
+                edges.append((i, i + side))
+    return side * side, edges
+
+
+def fat_tree(n, rng):
+    """Switches of the smallest k-ary fat-tree (k even) with at least `n` switches."""
+    k = 2
+    while 5 * k * k // 4 < n:
+        k += 2
+    half = k // 2
+    num_core = half * half
+    edges = []
+    for pod in range(k):
+        aggr = [num_core + pod * k + i for i in range(half)]
+        edge = [num_core + pod * k + half + i for i in range(half)]
+        for a in aggr:
+            for e in edge:
+                edges.append((a, e))
+        for i, a in enumerate(aggr):
+            for j in range(half):
+                edges.append((i * half + j, a))
+    return num_core + k * k, edges
+
+
+def random_geometric(n, rng):
+    """Routers at random points of the unit square, linked if they are close."""
+    points = [(rng.random(), rng.random()) for _ in range(n)]
+    radius = math.sqrt(2.0 * math.log(max(n, 2)) / (math.pi * max(n, 2)))
+    edges = [
+        (i, j)
+        for i in range(n)
+        for j in range(i + 1, n)
+        if math.dist(points[i], points[j]) <= radius
+    ]
+    return n, edges
+
+
+def scale_free(n, rng, m=2):
+    """Barabási-Albert preferential attachment graph."""
+    edges = [(i, j) for i in range(min(n, m + 1)) for j in range(i + 1, min(n, m + 1))]
+    targets = [v for edge in edges for v in edge]
+    for i in range(m + 1, n):
+        chosen = set()
+        while len(chosen) < m:
+            chosen.add(rng.choice(targets))
+        for j in sorted(chosen):
+            edges.append((j, i))
+            targets.extend((i, j))
+    return n, edges
+
+
+TOPOLOGIES = {
+    "ring": ring,
+    "grid": grid,
+    "fat-tree": fat_tree,
+    "random-geometric": random_geometric,
+    "scale-free": scale_free,
+}
+
+
+def connect_components(n, edges):
+    """Add edges between connected components until the graph is connected."""
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in edges:
+        parent[find(i)] = find(j)
+    roots = sorted({find(i) for i in range(n)})
+    for a, b in zip(roots, roots[1:]):
+        edges.append((a, b))
+        parent[find(a)] = find(b)
+    return edges
+
+
+def longest_route(dags):
+    """Return the number of links of the longest route in the DAGs of next hops
+    returned by `routegen.correct_route_dags`.
+    """
+    longest = 0
+    for dst, next_hops in dags.items():
+        hops = {dst: 0}  # Node: links of the longest route from it to dst
+        for start in next_hops:
+            stack = [start]
+            while stack:
+                node = stack[-1]
+                if node in hops:
+                    stack.pop()
+                    continue
+                pending = [hop for hop in next_hops[node] if hop not in hops]
+                if pending:
+                    stack.extend(pending)
+                else:
+                    hops[node] = 1 + max(hops[hop] for hop in next_hops[node])
+                    stack.pop()
+        longest = max(longest, max(hops.values()))
+    return longest
+
+
+def generate(
+    topology,
+    size,
+    num_clients=8,
+    seed=0,
+    max_cost=10,
+    asymmetric=False,
+    flaps=0,
+    client_send_rate=10,
+):
+    """Generate a network simulation configuration (see the bundled JSON files), with
+    its correct routes as "correct_route_dags" (see `routegen.py`).
+
+    Parameters
+    ----------
+    topology
+        One of the names in `TOPOLOGIES`.
+    size
+        The (approximate) number of routers.
+    num_clients
+        The number of clients, each linked to a different random router.
+    seed
+        The seed of the random generator, so that scenarios are reproducible.
+    max_cost
+        Link costs are random integers between 1 and `max_cost`.
+    asymmetric
+        Whether the two directions of a link have independent costs.
+    flaps
+        The number of random links that go down and come back up with the same costs.
+    client_send_rate
+        The interval between traceroute packets, in the JSON time unit.
+    """
+    rng = random.Random(seed)
+    n, edges = TOPOLOGIES[topology](size, rng)
+    edges = connect_components(n, sorted(set(edges)))
+    routers = [f"R{i}" for i in range(n)]
+    clients = [f"c{i}" for i in range(min(num_clients, n))]
+
+    ports = defaultdict(int)
+
+    def next_port(addr):
+        ports[addr] += 1
+        return ports[addr]
+
+    links = []
+    for i, j in edges:
+        c12 = rng.randint(1, max_cost)
+        c21 = rng.randint(1, max_cost) if asymmetric else c12
+        a, b = routers[i], routers[j]
+        links.append([a, b, next_port(a), next_port(b), c12, c21])
+    for client, i in zip(clients, rng.sample(range(n), len(clients))):
+        links.append([client, routers[i], next_port(client), next_port(routers[i]), 1, 1])
+
+    # Every flap restores the same link, so the correct routes are those of `links`
+    dags = correct_route_dags(routers, clients, links)
+    # Upper bound on the weighted diameter: longest route times the largest cost
+    diameter = (longest_route(dags) or 1) * max_cost
+
+    # Convergence needs about one weighted diameter for flooding; leave margin for
+    # heartbeats and for the flaps
+    changes = []
+    flap_time = 2 * client_send_rate
+    router_links = [link for link in links if link[0] in routers and link[1] in routers]
+    for link in rng.sample(router_links, min(flaps, len(router_links))):
+        changes.append([flap_time, [link[0], link[1]], "down"])
+        changes.append([flap_time + diameter + 20, list(link), "up"])
+        flap_time += 2 * client_send_rate
+    end_time = (flap_time if changes else 0) + 2 * diameter + 100
+
+    return {
+        "routers": routers,
+        "clients": clients,
+        "client_send_rate": client_send_rate,
+        "end_time": end_time,
+        "links": links,
+        "changes": changes,
+        "correct_route_dags": dags,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a network simulation configuration file (JSON)."
+    )
+    parser.add_argument("topology", choices=sorted(TOPOLOGIES))
+    parser.add_argument("size", type=int, help="Approximate number of routers.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Output path (default: stdout). Paths ending with .jsonl are written in "
+        "the JSON Lines format.",
+    )
+    parser.add_argument("--clients", type=int, default=8, help="Number of clients.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--max-cost", type=int, default=10, help="Maximum link cost.")
+    parser.add_argument(
+        "--asymmetric", action="store_true", help="Use different costs per direction."
+    )
+    parser.add_argument(
+        "--flaps", type=int, default=0, help="Number of links that go down and up."
+    )
+    args = parser.parse_args()
+
+    scenario = generate(
+        args.topology,
+        args.size,
+        num_clients=args.clients,
+        seed=args.seed,
+        max_cost=args.max_cost,
+        asymmetric=args.asymmetric,
+        flaps=args.flaps,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            if args.output.endswith(".jsonl"):
+                dump_jsonl(scenario, f)
+            else:
+                json.dump(scenario, f)
+    else:
+        print(json.dumps(scenario))
+
+
+if __name__ == "__main__":
+    main()
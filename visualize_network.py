@@ -80,10 +80,12 @@ class App:
         """Draw lines corresponding to links."""
         lines = {}
         line_labels = {}
+        self.line_costs = {}  # Costs shown on the line of every link
         for addr1, addr2, _, _, c12, c21 in self.network_params["links"]:
             line, line_label = self.draw_line(addr1, addr2, c12, c21)
             lines[(addr1, addr2)] = line
             line_labels[(addr1, addr2)] = line_label
+            self.line_costs[(addr1, addr2)] = (c12, c21)
         return lines, line_labels
 
     def draw_line(self, addr1, addr2, c12, c21):
@@ -221,15 +223,32 @@ class App:
             time.sleep(self.display_current_debug_rate / 1000)
 
     def visualize_changes(self, change, target):
-        """Make color and text changes to links upon add/remove/cost changes."""
-        if change == "up":
-            addr1, addr2, _, _, c12, c21 = target
-            new_line, _ = self.draw_line(addr1, addr2, c12, c21)
-            self.lines[(addr1, addr2)] = new_line
-        elif change == "down":
-            addr1, addr2 = target
-            self.canvas.delete(self.lines[(addr1, addr2)])
-            self.canvas.delete(self.line_labels[(addr1, addr2)])
+        """Redraw the links and routers after a change has been applied.
+
+        Lines are made to match the links that are up, with their current costs, so
+        that every kind of change is drawn when it takes effect: links of a crashed
+        router disappear until it restarts, and a link brought up while an endpoint is
+        crashed only appears when it restarts. Crashed routers are grayed out.
+        """
+        links = self.network.links
+        for key in list(self.lines):
+            if key not in links or links[key][2:4] != self.line_costs[key]:
+                self.canvas.delete(self.lines.pop(key))
+                self.canvas.delete(self.line_labels.pop(key))
+                del self.line_costs[key]
+        for (addr1, addr2), (_, _, c12, c21, _) in list(links.items()):
+            if (addr1, addr2) not in self.lines:
+                line, line_label = self.draw_line(addr1, addr2, c12, c21)
+                self.lines[(addr1, addr2)] = line
+                self.line_labels[(addr1, addr2)] = line_label
+                self.line_costs[(addr1, addr2)] = (c12, c21)
+        if change in ("crash", "restart") and target in self.rects:
+            fill = (
+                self.network_params["visualize"].get("crashed_color", "gray")
+                if target in self.network.crashed
+                else self.network_params["visualize"]["router_color"]
+            )
+            self.canvas.itemconfig(self.rects[target], fill=fill)
 
 
 def main():